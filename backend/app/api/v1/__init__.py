@@ -10,6 +10,7 @@ from .products import router as products_router
 from .inventory import router as inventory_router
 from .orders import router as orders_router
 from .stats import router as stats_router
+from .search import router as search_router
 
 # Create the main API router for version 1
 api_router = APIRouter()
@@ -45,6 +46,12 @@ api_router.include_router(
     tags=["statistics"]
 )
 
+api_router.include_router(
+    search_router,
+    prefix="/search",
+    tags=["search"]
+)
+
 # Export all routers
 __all__ = [
     "api_router",
@@ -52,5 +59,6 @@ __all__ = [
     "products_router",
     "inventory_router",
     "orders_router",
-    "stats_router"
+    "stats_router",
+    "search_router"
 ]
\ No newline at end of file
@@ -3,13 +3,22 @@ Clients API router for CRM Florist System
 Compatible with working SQLModel API structure
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, status
 from typing import List, Optional
+from datetime import datetime, date
+from sqlalchemy import case, true
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select, func
 import re
 
-from app.models import Client, Order, ClientType
+from app.models import Client, ClientStats, DuplicateCandidate, Order, OrderStatus, ClientType, ArchivedOrder
+from app.core.cache import invalidate
+from app.core.config import DEDUP_MIN_SCORE, IMPORT_BATCH_SIZE
 from app.db import get_session
+from app.schemas import ClientMergeRequest
+from app.services import archive, client_import, dedup, search as fulltext
+from app.services.client_stats import refresh_client_stats, remove_client_stats
+from app.services.phone_index import phone_index
 
 router = APIRouter()
 
@@ -20,12 +29,48 @@ async def get_clients(
     limit: int = Query(100, ge=1, le=1000),
     search: Optional[str] = None,
     client_type: Optional[str] = None,
+    sort_by: Optional[str] = Query(None, pattern="^(lifetime_value|orders_count|last_order_at)$"),
+    sort_order: str = Query("desc", pattern="^(asc|desc)$"),
+    min_orders: Optional[int] = Query(None, ge=0),
+    min_lifetime_value: Optional[float] = Query(None, ge=0),
+    last_order_from: Optional[date] = None,
+    last_order_to: Optional[date] = None,
     db: Session = Depends(get_session)
 ):
-    """Получить список клиентов с фильтрацией"""
+    """Получить список клиентов с фильтрацией и сортировкой по агрегатам заказов"""
     query = select(Client)
+    order_by = []
 
-    if search:
+    # Сортировка и фильтры по агрегатам идут по индексам client_stats
+    uses_stats = sort_by or any(
+        value is not None
+        for value in (min_orders, min_lifetime_value, last_order_from, last_order_to)
+    )
+    if uses_stats:
+        query = query.join(ClientStats, ClientStats.client_id == Client.id)
+    if min_orders is not None:
+        query = query.where(ClientStats.orders_count >= min_orders)
+    if min_lifetime_value is not None:
+        query = query.where(ClientStats.lifetime_value >= min_lifetime_value)
+    if last_order_from:
+        query = query.where(ClientStats.last_order_at >= datetime.combine(last_order_from, datetime.min.time()))
+    if last_order_to:
+        query = query.where(ClientStats.last_order_at <= datetime.combine(last_order_to, datetime.max.time()))
+    if sort_by:
+        column = getattr(ClientStats, sort_by)
+        order_by.append(column.desc().nulls_last() if sort_order == "desc" else column.asc().nulls_first())
+
+    if search and fulltext.looks_like_phone(search):
+        # Часть номера ищем по индексу телефонов (начало или конец номера)
+        phone_index.ensure_fresh(db)
+        query = query.where(Client.id.in_(phone_index.lookup(search, limit=skip + limit)))
+    elif search and fulltext.is_supported(db):
+        ranked = fulltext.ranked_ids(db, Client.__tablename__, search)
+        if ranked is None:
+            return []
+        query = query.join(ranked, ranked.c.id == Client.id)
+        order_by.append(ranked.c.rank)
+    elif search:
         search_pattern = f"%{search}%"
         query = query.where(
             (Client.name.ilike(search_pattern)) |
@@ -36,11 +81,132 @@ async def get_clients(
     if client_type and client_type in ["заказчик", "получатель", "оба"]:
         query = query.where(Client.client_type == client_type)
 
-    query = query.offset(skip).limit(limit)
+    query = query.order_by(*order_by).offset(skip).limit(limit)
     clients = db.exec(query).all()
     return clients
 
 
+@router.post("/import")
+def import_clients_file(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, alias="format", pattern="^(csv|jsonl)$"),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+    db: Session = Depends(get_session)
+):
+    """
+    Массовый импорт клиентов из CSV или JSONL.
+    Клиенты с существующим телефоном обновляются, ошибки возвращаются
+    в отчете с номерами строк.
+    """
+    try:
+        return client_import.import_clients(
+            db,
+            client_import.text_stream(file.file),
+            client_import.detect_format(file.filename, file_format),
+            batch_size
+        )
+    except client_import.DuplicatePhonesError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+
+
+@router.get("/lookup")
+async def lookup_client_by_phone(
+    phone: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+    orders_limit: int = Query(3, ge=0, le=20),
+    db: Session = Depends(get_session)
+):
+    """Найти звонящего по полному номеру или его части, с последними заказами"""
+    phone_index.ensure_fresh(db)
+    client_ids = phone_index.lookup(phone, limit=limit)
+    if not client_ids:
+        return []
+
+    clients = {
+        client.id: client
+        for client in db.exec(select(Client).where(Client.id.in_(client_ids))).all()
+    }
+
+    recent_orders = {client_id: [] for client_id in client_ids}
+    if orders_limit:
+        position = func.row_number().over(
+            partition_by=Order.client_id,
+            order_by=Order.created_at.desc()
+        ).label("position")
+        ranked = select(Order.id, position).where(Order.client_id.in_(client_ids)).subquery()
+        orders = db.exec(
+            select(Order)
+            .join(ranked, ranked.c.id == Order.id)
+            .where(ranked.c.position <= orders_limit)
+            .order_by(Order.created_at.desc())
+        ).all()
+        for order in orders:
+            recent_orders[order.client_id].append(order)
+
+    return [
+        {"client": clients[client_id], "recent_orders": recent_orders[client_id]}
+        for client_id in client_ids
+        if client_id in clients
+    ]
+
+
+@router.get("/duplicates")
+async def get_duplicate_candidates(
+    min_score: float = Query(0, ge=0, le=1),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_session)
+):
+    """Получить найденные пары клиентов-дубликатов (по убыванию оценки)"""
+    candidates = db.exec(
+        select(DuplicateCandidate)
+        .where(DuplicateCandidate.score >= min_score)
+        .order_by(DuplicateCandidate.score.desc(), DuplicateCandidate.id)
+        .offset(skip)
+        .limit(limit)
+    ).all()
+
+    client_ids = {c.client_id for c in candidates} | {c.duplicate_id for c in candidates}
+    clients = {
+        client.id: client
+        for client in db.exec(select(Client).where(Client.id.in_(client_ids))).all()
+    }
+
+    return [
+        {
+            "client": clients.get(candidate.client_id),
+            "duplicate": clients.get(candidate.duplicate_id),
+            "score": candidate.score,
+            "reasons": candidate.reasons.split(",") if candidate.reasons else [],
+            "detected_at": candidate.detected_at,
+        }
+        for candidate in candidates
+    ]
+
+
+@router.post("/duplicates/scan")
+def scan_duplicates(
+    min_score: float = Query(DEDUP_MIN_SCORE, ge=0, le=1),
+    db: Session = Depends(get_session)
+):
+    """Запустить поиск дубликатов по всей базе клиентов"""
+    found = dedup.store_duplicates(db, dedup.find_duplicates(db, min_score))
+    return {"message": "Duplicate scan completed", "candidates": found}
+
+
+@router.post("/{client_id}/merge", response_model=Client)
+async def merge_clients(
+    client_id: int,
+    merge_request: ClientMergeRequest,
+    db: Session = Depends(get_session)
+):
+    """Слить клиентов-дубликатов в указанного клиента вместе с их заказами"""
+    try:
+        return dedup.merge_clients(db, client_id, merge_request.source_ids)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
 @router.get("/{client_id}", response_model=Client)
 async def get_client(client_id: int, db: Session = Depends(get_session)):
     """Получить клиента по ID"""
@@ -74,8 +240,12 @@ async def create_client(
         )
 
     db.add(client)
+    db.flush()
+    refresh_client_stats(db, [client.id])
+    invalidate(db, "clients")
     db.commit()
     db.refresh(client)
+    phone_index.add(client.id, client.phone)
     return client
 
 
@@ -90,15 +260,39 @@ async def update_client(
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
 
-    # Обновляем только переданные поля
+    old_phone = client.phone
+
     update_data = client_update.model_dump(exclude_unset=True)
+
+    # Проверка на дубликат телефона
+    new_phone = update_data.get("phone", old_phone)
+    if new_phone != old_phone:
+        existing = db.exec(
+            select(Client.id).where(Client.phone == new_phone, Client.id != client_id)
+        ).first()
+        if existing:
+            raise HTTPException(
+                status_code=400,
+                detail="Client with this phone already exists"
+            )
+
+    # Обновляем только переданные поля
     for key, value in update_data.items():
         if key != 'id':
             setattr(client, key, value)
 
     db.add(client)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Телефон заняли параллельным запросом (уникальный индекс uq_clients_phone)
+        db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="Client with this phone already exists"
+        )
     db.refresh(client)
+    phone_index.update(client.id, old_phone, client.phone)
     return client
 
 
@@ -114,6 +308,10 @@ async def delete_client(client_id: int, db: Session = Depends(get_session)):
         select(func.count()).select_from(Order)
         .where((Order.client_id == client_id) | (Order.recipient_id == client_id))
     ).one()
+    orders_count += db.exec(
+        select(func.count()).select_from(ArchivedOrder)
+        .where((ArchivedOrder.client_id == client_id) | (ArchivedOrder.recipient_id == client_id))
+    ).one()
 
     if orders_count > 0:
         raise HTTPException(
@@ -121,8 +319,11 @@ async def delete_client(client_id: int, db: Session = Depends(get_session)):
             detail=f"Cannot delete client with {orders_count} orders"
         )
 
+    remove_client_stats(db, client_id)
     db.delete(client)
+    invalidate(db, "clients")
     db.commit()
+    phone_index.remove(client_id, client.phone)
     return {"message": "Client deleted successfully"}
 
 
@@ -151,4 +352,84 @@ async def get_client_orders(
         "orders_as_customer": as_customer,
         "orders_as_recipient": as_recipient,
         "total_orders": len(as_customer) + len(as_recipient)
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/{client_id}/order-history")
+async def get_client_order_history(
+    client_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_session)
+):
+    """
+    История заказов клиента постранично: заказы, где он заказчик или
+    получатель, с флагом роли и сводкой — одним запросом. Фильтр дат
+    ограничивает страницу и total, сводка считается за все время с архивом.
+    """
+    client = db.get(Client, client_id)
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+
+    orders = archive.orders_source(archive.range_reaches_archive(db, date_from))
+    as_customer = orders.c.client_id == client_id
+    as_recipient = orders.c.recipient_id == client_id
+    role = case(
+        (as_customer & as_recipient, "both"),
+        (as_customer, "customer"),
+        else_="recipient"
+    ).label("role")
+
+    matched = select(*orders.c, role).where(as_customer | as_recipient)
+    if date_from:
+        matched = matched.where(orders.c.delivery_date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        matched = matched.where(orders.c.delivery_date <= datetime.combine(date_to, datetime.max.time()))
+    matched = matched.cte("matched")
+
+    # Сводка — за все время, включая архив: не зависит от фильтра дат
+    # и не уменьшается после архивации. Фильтр дат действует на страницу и total.
+    history = archive.orders_source(True)
+    is_customer = history.c.client_id == client_id
+    is_recipient = history.c.recipient_id == client_id
+    is_paid_customer = is_customer & (history.c.status != OrderStatus.CANCELED)
+    summary = select(
+        select(func.count()).select_from(matched).scalar_subquery().label("total"),
+        func.coalesce(func.sum(case((is_customer, 1), else_=0)), 0).label("orders_as_customer"),
+        func.coalesce(func.sum(case((is_recipient, 1), else_=0)), 0).label("orders_as_recipient"),
+        func.coalesce(func.sum(case((is_paid_customer, history.c.total_price), else_=0)), 0).label("lifetime_spend"),
+        func.max(case((is_customer, history.c.created_at))).label("last_order_at"),
+    ).where(is_customer | is_recipient).cte("summary")
+
+    newest_first = (matched.c.created_at.desc(), matched.c.id.desc())
+    page = select(matched).order_by(*newest_first).offset(skip).limit(limit).cte("page")
+
+    rows = db.execute(
+        select(summary, page)
+        .select_from(summary.outerjoin(page, true()))
+        .order_by(page.c.created_at.desc(), page.c.id.desc())
+    ).mappings().all()
+
+    first = rows[0]
+    order_fields = list(Order.__table__.columns.keys()) + ["role"]
+    items = [
+        {name: row[name] for name in order_fields}
+        for row in rows
+        if row["id"] is not None
+    ]
+
+    return {
+        "items": items,
+        "total": first["total"],
+        "skip": skip,
+        "limit": limit,
+        "has_more": skip + limit < first["total"],
+        "summary": {
+            "orders_as_customer": first["orders_as_customer"],
+            "orders_as_recipient": first["orders_as_recipient"],
+            "lifetime_spend": first["lifetime_spend"],
+            "last_order_at": first["last_order_at"],
+        },
+    }
@@ -3,15 +3,40 @@ Inventory API router for CRM Florist System
 Compatible with working SQLModel API structure
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query, status
+import asyncio
+import json
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
+from datetime import datetime, date
 from sqlmodel import Session, select
 
-from app.models import Inventory
-from app.db import get_session
+from app.models import (
+    Inventory, InventoryAudit, InventoryTransaction, InventoryTransactionType, LowStockItem
+)
+from app.core.cache import TTLCache, invalidate
+from app.core.config import CATALOG_CACHE_TTL, DEMAND_HISTORY_DAYS, LOW_STOCK_POLL_SECONDS
+from app.core.timebuckets import local_today
+from app.db import engine, get_session
+from app.services import inventory_audit, low_stock
+from app.schemas import InventoryMovementRequest, InventoryAuditCount
+from app.services.demand_forecast import demand_forecast
+from app.services.reservations import projected_availability
+from app.services.stock_ledger import (
+    apply_deltas, balances_at, has_stock_history, remove_item_snapshots, transaction_dict
+)
 
 router = APIRouter()
 
+# Прогноз пересчитывается только после изменения заказов, состава или остатков
+forecast_cache = TTLCache(
+    "demand_forecast",
+    namespaces=("orders", "products", "inventory", "stock"),
+    maxsize=64,
+    ttl=CATALOG_CACHE_TTL
+)
+
 
 @router.get("/", response_model=List[Inventory])
 async def get_inventory(
@@ -25,10 +50,7 @@ async def get_inventory(
     query = select(Inventory)
 
     if low_stock:
-        query = query.where(
-            (Inventory.min_quantity.isnot(None)) &
-            (Inventory.quantity <= Inventory.min_quantity)
-        )
+        query = query.join(LowStockItem, LowStockItem.inventory_id == Inventory.id)
 
     if search:
         query = query.where(Inventory.name.ilike(f"%{search}%"))
@@ -38,6 +60,161 @@ async def get_inventory(
     return items
 
 
+# ============= INVENTORY AUDIT API =============
+
+def _get_audit_or_404(db: Session, audit_id: int) -> InventoryAudit:
+    audit = db.get(InventoryAudit, audit_id)
+    if not audit:
+        raise HTTPException(status_code=404, detail="Audit not found")
+    return audit
+
+
+@router.get("/audit/current")
+async def get_current_audit(db: Session = Depends(get_session)):
+    """Незавершенная инвентаризация с расхождениями (или null)"""
+    audit = inventory_audit.current_audit(db)
+    return inventory_audit.audit_view(db, audit) if audit else None
+
+
+@router.post("/audit/start")
+async def start_audit(db: Session = Depends(get_session)):
+    """Начать инвентаризацию"""
+    try:
+        audit = inventory_audit.start_audit(db)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return inventory_audit.audit_view(db, audit)
+
+
+@router.get("/audit/{audit_id}")
+async def get_audit(audit_id: int, db: Session = Depends(get_session)):
+    """Инвентаризация с расхождениями"""
+    return inventory_audit.audit_view(db, _get_audit_or_404(db, audit_id))
+
+
+@router.post("/audit/{audit_id}/items")
+async def save_audit_items(
+    audit_id: int,
+    counts: List[InventoryAuditCount],
+    db: Session = Depends(get_session)
+):
+    """Сохранить подсчитанные количества пачкой"""
+    audit = _get_audit_or_404(db, audit_id)
+    try:
+        inventory_audit.save_counts(
+            db, audit, {count.inventory_id: count.actual_quantity for count in counts}
+        )
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return inventory_audit.audit_view(db, audit)
+
+
+@router.post("/audit/{audit_id}/complete")
+async def complete_audit(audit_id: int, db: Session = Depends(get_session)):
+    """Завершить инвентаризацию и провести корректировки"""
+    audit = _get_audit_or_404(db, audit_id)
+    try:
+        return inventory_audit.complete_audit(db, audit)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+# ============= STOCK STATE API =============
+
+@router.get("/low-stock")
+async def get_low_stock_items(db: Session = Depends(get_session)):
+    """Позиции с низким остатком (готовое множество, без сканирования склада)"""
+    return low_stock.low_stock_items(db)
+
+
+@router.get("/low-stock/events")
+async def get_low_stock_events(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_session)
+):
+    """Журнал переходов через минимальный остаток"""
+    return low_stock.events_after(db, after_id, limit)
+
+
+@router.get("/low-stock/stream")
+async def stream_low_stock_events(request: Request, after_id: Optional[int] = None):
+    """
+    Поток оповещений о низком остатке (Server-Sent Events).
+    Без after_id и заголовка Last-Event-ID отдаются только новые события.
+    """
+    last_id = after_id
+    if last_id is None and request.headers.get("last-event-id", "").isdigit():
+        last_id = int(request.headers["last-event-id"])
+    if last_id is None:
+        with Session(engine) as session:
+            last_id = low_stock.last_event_id(session)
+
+    async def events():
+        nonlocal last_id
+        idle_polls = 0
+        while not await request.is_disconnected():
+            with Session(engine) as session:
+                batch = low_stock.events_after(session, last_id)
+            for event in batch:
+                last_id = event["id"]
+                payload = json.dumps(event, ensure_ascii=False, default=str)
+                yield f"id: {last_id}\nevent: low_stock\ndata: {payload}\n\n"
+
+            idle_polls = 0 if batch else idle_polls + 1
+            if idle_polls * LOW_STOCK_POLL_SECONDS >= 15:
+                idle_polls = 0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(LOW_STOCK_POLL_SECONDS)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/balances")
+async def get_inventory_balances(
+    at: datetime,
+    db: Session = Depends(get_session)
+):
+    """Остатки всех позиций на момент времени (по снимку и журналу)"""
+    balances = balances_at(db, at)
+    items = db.exec(select(Inventory.id, Inventory.name, Inventory.unit).order_by(Inventory.id)).all()
+    return [
+        {"inventory_id": item_id, "name": name, "unit": unit, "quantity": balances.get(item_id, 0)}
+        for item_id, name, unit in items
+    ]
+
+
+@router.get("/projection")
+async def get_inventory_projection(
+    days: int = Query(14, ge=1, le=90),
+    start: Optional[date] = None,
+    inventory_id: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_session)
+):
+    """Прогноз доступного остатка по дням с учетом резервов открытых заказов"""
+    return projected_availability(db, days, start, inventory_id)
+
+
+@router.get("/forecast")
+async def get_demand_forecast(
+    days: int = Query(14, ge=1, le=90),
+    start: Optional[date] = None,
+    history_days: int = Query(DEMAND_HISTORY_DAYS, ge=1, le=365),
+    inventory_id: Optional[List[int]] = Query(None),
+    db: Session = Depends(get_session)
+):
+    """Прогноз потребности в материалах по дням: заказы по составу + скользящее среднее продаж"""
+    start = start or local_today()
+    key = (days, start, history_days, tuple(sorted(inventory_id)) if inventory_id else None)
+    return forecast_cache.get_or_load(
+        key, lambda: demand_forecast(db, days, start, history_days, inventory_id)
+    )
+
+
 @router.get("/{inventory_id}", response_model=Inventory)
 async def get_inventory_item(inventory_id: int, db: Session = Depends(get_session)):
     """Получить складскую позицию по ID"""
@@ -53,7 +230,14 @@ async def create_inventory_item(
     db: Session = Depends(get_session)
 ):
     """Создать новую складскую позицию"""
+    # Начальный остаток проводится через журнал
+    opening = item.quantity or 0
+    item.quantity = 0
     db.add(item)
+    db.flush()
+    apply_deltas(db, {item.id: opening}, InventoryTransactionType.SUPPLY, "Начальный остаток")
+    low_stock.track_low_stock(db, [item.id])
+    invalidate(db, "inventory")
     db.commit()
     db.refresh(item)
     return item
@@ -71,11 +255,23 @@ async def update_inventory_item(
         raise HTTPException(status_code=404, detail="Inventory item not found")
 
     update_data = item_update.model_dump(exclude_unset=True)
+    new_quantity = update_data.pop("quantity", None)
+    changed = False
     for key, value in update_data.items():
-        if key != 'id':
+        if key not in ('id', 'created_at') and getattr(item, key) != value:
             setattr(item, key, value)
+            changed = True
 
     db.add(item)
+    if changed:
+        low_stock.track_low_stock(db, [inventory_id])
+        invalidate(db, "inventory")
+    # Остаток не перезаписывается, а корректируется движением в журнале
+    if new_quantity is not None:
+        apply_deltas(
+            db, {inventory_id: new_quantity - item.quantity}, InventoryTransactionType.ADJUSTMENT,
+            "Корректировка остатка"
+        )
     db.commit()
     db.refresh(item)
     return item
@@ -83,11 +279,89 @@ async def update_inventory_item(
 
 @router.delete("/{inventory_id}")
 async def delete_inventory_item(inventory_id: int, db: Session = Depends(get_session)):
-    """Удалить складскую позицию"""
+    """Удалить складскую позицию (только без истории движений)"""
     item = db.get(Inventory, inventory_id)
     if not item:
         raise HTTPException(status_code=404, detail="Inventory item not found")
+    if has_stock_history(db, inventory_id):
+        raise HTTPException(status_code=400, detail="Item has stock history")
 
+    remove_item_snapshots(db, inventory_id)
+    low_stock.forget_item(db, inventory_id)
     db.delete(item)
+    invalidate(db, "inventory")
+    db.commit()
+    return {"message": "Inventory item deleted successfully"}
+
+
+def _get_item_or_404(db: Session, inventory_id: int) -> Inventory:
+    item = db.get(Inventory, inventory_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Inventory item not found")
+    return item
+
+
+@router.get("/{inventory_id}/transactions")
+async def get_inventory_transactions(
+    inventory_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_session)
+):
+    """Журнал движений позиции, новые сверху"""
+    _get_item_or_404(db, inventory_id)
+    transactions = db.exec(
+        select(InventoryTransaction)
+        .where(InventoryTransaction.inventory_id == inventory_id)
+        .order_by(InventoryTransaction.id.desc())
+        .offset(skip)
+        .limit(limit)
+    ).all()
+    return [transaction_dict(transaction) for transaction in transactions]
+
+
+@router.get("/{inventory_id}/balance")
+async def get_inventory_balance(
+    inventory_id: int,
+    at: datetime,
+    db: Session = Depends(get_session)
+):
+    """Остаток позиции на момент времени"""
+    item = _get_item_or_404(db, inventory_id)
+    balance = balances_at(db, at, [inventory_id]).get(inventory_id, 0)
+    return {"inventory_id": inventory_id, "unit": item.unit, "at": at, "quantity": balance}
+
+
+@router.post("/{inventory_id}/supply")
+async def supply_inventory_item(
+    inventory_id: int,
+    movement: InventoryMovementRequest,
+    db: Session = Depends(get_session)
+):
+    """Оприходовать поступление"""
+    _get_item_or_404(db, inventory_id)
+    [transaction] = apply_deltas(
+        db, {inventory_id: movement.quantity}, InventoryTransactionType.SUPPLY, movement.comment
+    )
+    db.commit()
+    db.refresh(transaction)
+    return transaction_dict(transaction)
+
+
+@router.post("/{inventory_id}/write-off")
+async def write_off_inventory_item(
+    inventory_id: int,
+    movement: InventoryMovementRequest,
+    db: Session = Depends(get_session)
+):
+    """Списать материал (брак, увядание)"""
+    item = _get_item_or_404(db, inventory_id)
+    if movement.quantity > item.quantity:
+        raise HTTPException(status_code=400, detail="Write-off exceeds current stock")
+
+    [transaction] = apply_deltas(
+        db, {inventory_id: -movement.quantity}, InventoryTransactionType.WASTE, movement.comment
+    )
     db.commit()
-    return {"message": "Inventory item deleted successfully"}
\ No newline at end of file
+    db.refresh(transaction)
+    return transaction_dict(transaction)
@@ -4,6 +4,7 @@ Compatible with working SQLModel API structure
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime, date
 from sqlmodel import Session, select, func
@@ -14,6 +15,11 @@ from app.models import (
     Inventory, ProductInventory, User
 )
 from app.db import get_session
+from app.services import archive, order_sync
+from app.services.order_export import export_orders_csv
+from app.services.sales_rollup import order_day
+from app.services.workload import balancer
+from app.services.stock_ledger import InsufficientStockError
 
 router = APIRouter()
 
@@ -23,6 +29,18 @@ class StatusUpdateRequest(BaseModel):
     comment: Optional[str] = None
 
 
+def _sync_order(db: Session, before, after: Optional[Order]) -> None:
+    """Обновить производные данные заказа; нехватка материалов — 409 без изменений"""
+    try:
+        order_sync.sync_order_change(db, before, after)
+    except InsufficientStockError as error:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Not enough stock to assemble the order", "shortages": error.shortages}
+        )
+
+
 @router.get("/", response_model=List[Order])
 async def get_orders(
     skip: int = Query(0, ge=0),
@@ -33,26 +51,51 @@ async def get_orders(
     date_to: Optional[date] = None,
     db: Session = Depends(get_session)
 ):
-    """Получить список заказов"""
-    query = select(Order)
+    """Получить список заказов (с архивом, если диапазон дат до него доходит)"""
+    if archive.range_reaches_archive(db, date_from):
+        source = archive.orders_source(include_archive=True)
+        query = _filter_orders(select(source), source.c, status, client_id, date_from, date_to)
+        query = query.order_by(source.c.created_at.desc()).offset(skip).limit(limit)
+        return [Order(**row) for row in db.execute(query).mappings().all()]
+
+    query = _filter_orders(select(Order), Order, status, client_id, date_from, date_to)
+    query = query.order_by(Order.created_at.desc()).offset(skip).limit(limit)
+    orders = db.exec(query).all()
+    return orders
 
+
+def _filter_orders(query, columns, status, client_id, date_from, date_to):
+    """Общие фильтры списка заказов для живой таблицы и архива"""
     if status:
-        query = query.where(Order.status == status)
+        query = query.where(columns.status == status)
 
     if client_id:
         query = query.where(
-            (Order.client_id == client_id) | (Order.recipient_id == client_id)
+            (columns.client_id == client_id) | (columns.recipient_id == client_id)
         )
 
     if date_from:
-        query = query.where(Order.delivery_date >= datetime.combine(date_from, datetime.min.time()))
+        query = query.where(columns.delivery_date >= datetime.combine(date_from, datetime.min.time()))
 
     if date_to:
-        query = query.where(Order.delivery_date <= datetime.combine(date_to, datetime.max.time()))
+        query = query.where(columns.delivery_date <= datetime.combine(date_to, datetime.max.time()))
 
-    query = query.order_by(Order.created_at.desc()).offset(skip).limit(limit)
-    orders = db.exec(query).all()
-    return orders
+    return query
+
+
+@router.get("/export")
+async def export_orders(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[OrderStatus] = None
+):
+    """Выгрузка заказов с клиентами и позициями в CSV (потоком, дни по времени магазина)"""
+    filename = f"orders_{date_from or 'all'}_{date_to or 'all'}.csv"
+    return StreamingResponse(
+        export_orders_csv(date_from, date_to, status),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
 @router.get("/{order_id}")
@@ -123,6 +166,8 @@ async def create_order(
         raise HTTPException(status_code=404, detail="Recipient not found")
 
     db.add(order)
+    db.flush()
+    _sync_order(db, None, order)
     db.commit()
     db.refresh(order)
 
@@ -151,6 +196,7 @@ async def update_order(
         raise HTTPException(status_code=404, detail="Order not found")
 
     old_status = order.status
+    before = order_sync.snapshot(order)
     update_data = order_update.model_dump(exclude_unset=True)
 
     for key, value in update_data.items():
@@ -158,6 +204,7 @@ async def update_order(
             setattr(order, key, value)
 
     db.add(order)
+    _sync_order(db, before, order)
     db.commit()
 
     # Если изменился статус, добавляем в историю
@@ -187,12 +234,15 @@ async def patch_order(
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    before = order_sync.snapshot(order)
+
     # Применяем только переданные поля
     for key, value in order_update.items():
         if key != 'id' and hasattr(order, key):
             setattr(order, key, value)
 
     db.add(order)
+    _sync_order(db, before, order)
     db.commit()
     db.refresh(order)
 
@@ -235,9 +285,11 @@ async def update_order_status(
         raise HTTPException(status_code=404, detail="Order not found")
 
     old_status = order.status
+    before = order_sync.snapshot(order)
     order.status = status
 
     db.add(order)
+    _sync_order(db, before, order)
 
     # Добавляем запись в историю
     history = OrderHistory(
@@ -254,6 +306,38 @@ async def update_order_status(
     return {"message": "Status updated", "order": order}
 
 
+@router.post("/{order_id}/assign", response_model=Order)
+async def assign_order_executor(
+    order_id: int,
+    reassign: bool = False,
+    db: Session = Depends(get_session)
+):
+    """Назначить заказу наименее загруженного исполнителя на день доставки"""
+    order = db.get(Order, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if order.executor_id and not reassign:
+        raise HTTPException(status_code=400, detail="Order already has an executor")
+
+    before = order_sync.snapshot(order)
+    # Сам заказ не должен влиять на выбор при переназначении
+    executor_id = balancer.pick(db, order_day(order.delivery_date), exclude=before)
+    if executor_id is None:
+        raise HTTPException(status_code=400, detail="No executors available")
+
+    order.executor_id = executor_id
+    db.add(order)
+    _sync_order(db, before, order)
+    db.add(OrderHistory(
+        order_id=order_id,
+        action="executor_assigned",
+        comment=f"Назначен исполнитель #{executor_id}"
+    ))
+    db.commit()
+    db.refresh(order)
+    return order
+
+
 @router.delete("/{order_id}")
 async def delete_order(order_id: int, db: Session = Depends(get_session)):
     """Удалить заказ"""
@@ -272,7 +356,10 @@ async def delete_order(order_id: int, db: Session = Depends(get_session)):
         db.delete(h)
 
     # Теперь удаляем сам заказ
+    before = order_sync.snapshot(order)
     db.delete(order)
+    db.flush()
+    _sync_order(db, before, None)
     db.commit()
     return {"message": "Order deleted successfully"}
 
@@ -294,6 +381,7 @@ async def add_order_item(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
+    before = order_sync.snapshot(order)
     item.order_id = order_id
     item.price = item.price or product.price
 
@@ -308,6 +396,7 @@ async def add_order_item(
 
     order.total_price = total or 0
     db.add(order)
+    _sync_order(db, before, order)
     db.commit()
 
     db.refresh(item)
@@ -334,6 +423,7 @@ async def delete_order_item(
 
     # Обновляем общую сумму заказа
     order = db.get(Order, order_id)
+    before = order_sync.snapshot(order)
     total = db.exec(
         select(func.sum(OrderItem.price * OrderItem.quantity))
         .where(OrderItem.order_id == order_id)
@@ -341,6 +431,7 @@ async def delete_order_item(
 
     order.total_price = total or 0
     db.add(order)
+    _sync_order(db, before, order)
     db.commit()
 
     return {"message": "Order item deleted successfully"}
\ No newline at end of file
@@ -7,11 +7,40 @@ from fastapi import APIRouter, HTTPException, Depends, Query, status
 from typing import List, Optional
 from sqlmodel import Session, select
 
-from app.models import Product, ProductCategory
+from app.models import Product, ProductCategory, ProductInventory, Inventory
+from app.core.cache import TTLCache, invalidate
+from app.core.config import CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL
 from app.db import get_session
+from app.services.availability import availability
+from app.services.product_costs import cost_rollup
+from app.services.product_facets import apply_search, faceted_search
 
 router = APIRouter()
 
+# Каталог меняется несколько раз в день, а читается каждой формой заказа
+catalog_cache = TTLCache(
+    "catalog",
+    namespaces=("products",),
+    maxsize=CATALOG_CACHE_SIZE,
+    ttl=CATALOG_CACHE_TTL
+)
+
+# Фасеты учитывают наличие, поэтому зависят и от остатков
+facets_cache = TTLCache(
+    "catalog_facets",
+    namespaces=("products", "inventory", "stock"),
+    maxsize=CATALOG_CACHE_SIZE,
+    ttl=CATALOG_CACHE_TTL
+)
+
+# Себестоимость зависит и от состава продуктов, и от цен материалов
+costs_cache = TTLCache(
+    "product_costs",
+    namespaces=("products", "inventory"),
+    maxsize=1,
+    ttl=CATALOG_CACHE_TTL
+)
+
 
 @router.get("/", response_model=List[Product])
 async def get_products(
@@ -23,7 +52,15 @@ async def get_products(
     search: Optional[str] = None,
     db: Session = Depends(get_session)
 ):
-    """Получить список продуктов"""
+    """Получить список продуктов (через кэш каталога)"""
+    key = ("list", skip, limit, category, min_price, max_price, search)
+    return catalog_cache.get_or_load(
+        key,
+        lambda: _load_products(db, skip, limit, category, min_price, max_price, search)
+    )
+
+
+def _load_products(db, skip, limit, category, min_price, max_price, search):
     query = select(Product)
 
     if category:
@@ -35,21 +72,72 @@ async def get_products(
     if max_price is not None:
         query = query.where(Product.price <= max_price)
 
-    if search:
-        query = query.where(
-            (Product.name.ilike(f"%{search}%")) |
-            (Product.description.ilike(f"%{search}%"))
-        )
+    query = apply_search(db, query, search)
+    if query is None:
+        return []
 
     query = query.offset(skip).limit(limit)
     products = db.exec(query).all()
     return products
 
 
+@router.get("/faceted")
+async def get_products_faceted(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=1000),
+    category: Optional[ProductCategory] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    search: Optional[str] = None,
+    db: Session = Depends(get_session)
+):
+    """Страница продуктов со счетчиками по категориям, ценам и наличию"""
+    key = (skip, limit, category, min_price, max_price, in_stock, search)
+    return facets_cache.get_or_load(
+        key,
+        lambda: faceted_search(db, category, min_price, max_price, in_stock, search, skip, limit)
+    )
+
+
+@router.get("/cache-stats")
+async def get_catalog_cache_stats():
+    """Счетчики попаданий и промахов кэшей каталога в этом воркере"""
+    return [cache.stats() for cache in (catalog_cache, facets_cache, costs_cache)]
+
+
+@router.get("/costs")
+async def get_product_costs(
+    category: Optional[ProductCategory] = None,
+    db: Session = Depends(get_session)
+):
+    """Себестоимость материалов и маржа по всему каталогу (через кэш)"""
+    rollup = costs_cache.get_or_load("all", lambda: cost_rollup(db))
+    if category:
+        rollup = [row for row in rollup if row["category"] == category]
+    return rollup
+
+
+@router.get("/availability")
+async def get_product_availability(
+    product_id: Optional[List[int]] = Query(None),
+    available_only: bool = False,
+    db: Session = Depends(get_session)
+):
+    """
+    Сколько единиц каждого продукта можно собрать из текущих остатков.
+    buildable = null — у продукта не задан состав.
+    """
+    report = availability.report(db, product_id)
+    if available_only:
+        report = [row for row in report if row["buildable"] != 0]
+    return report
+
+
 @router.get("/{product_id}", response_model=Product)
 async def get_product(product_id: int, db: Session = Depends(get_session)):
-    """Получить продукт по ID"""
-    product = db.get(Product, product_id)
+    """Получить продукт по ID (через кэш каталога)"""
+    product = catalog_cache.get_or_load(("item", product_id), lambda: db.get(Product, product_id))
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     return product
@@ -62,6 +150,7 @@ async def create_product(
 ):
     """Создать новый продукт"""
     db.add(product)
+    invalidate(db, "products")
     db.commit()
     db.refresh(product)
     return product
@@ -84,6 +173,7 @@ async def update_product(
             setattr(product, key, value)
 
     db.add(product)
+    invalidate(db, "products")
     db.commit()
     db.refresh(product)
     return product
@@ -97,5 +187,112 @@ async def delete_product(product_id: int, db: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail="Product not found")
 
     db.delete(product)
+    invalidate(db, "products")
+    db.commit()
+    return {"message": "Product deleted successfully"}
+
+
+def _composition_item(link: ProductInventory, inventory: Optional[Inventory]) -> dict:
+    return {
+        "id": link.id,
+        "product_id": link.product_id,
+        "inventory_id": link.inventory_id,
+        "quantity_needed": link.quantity_needed,
+        "inventory": {
+            "id": inventory.id,
+            "name": inventory.name,
+            "unit": inventory.unit,
+            "price_per_unit": inventory.price_per_unit,
+            "quantity": inventory.quantity,
+        } if inventory else None,
+    }
+
+
+def _get_composition_link(db: Session, product_id: int, composition_id: int) -> ProductInventory:
+    link = db.get(ProductInventory, composition_id)
+    if not link or link.product_id != product_id:
+        raise HTTPException(status_code=404, detail="Composition item not found")
+    return link
+
+
+@router.get("/{product_id}/composition")
+async def get_product_composition(product_id: int, db: Session = Depends(get_session)):
+    """Получить состав продукта с данными материалов"""
+    if not db.get(Product, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    rows = db.exec(
+        select(ProductInventory, Inventory)
+        .outerjoin(Inventory, Inventory.id == ProductInventory.inventory_id)
+        .where(ProductInventory.product_id == product_id)
+        .order_by(ProductInventory.id)
+    ).all()
+    return [_composition_item(link, inventory) for link, inventory in rows]
+
+
+@router.post("/{product_id}/composition")
+async def add_product_composition(
+    product_id: int,
+    inventory_id: int = Query(..., gt=0),
+    quantity_needed: float = Query(..., gt=0),
+    db: Session = Depends(get_session)
+):
+    """Добавить материал в состав продукта"""
+    if not db.get(Product, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    inventory = db.get(Inventory, inventory_id)
+    if not inventory:
+        raise HTTPException(status_code=404, detail="Inventory item not found")
+
+    existing = db.exec(
+        select(ProductInventory.id).where(
+            ProductInventory.product_id == product_id,
+            ProductInventory.inventory_id == inventory_id
+        )
+    ).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Inventory item is already in product composition")
+
+    link = ProductInventory(
+        product_id=product_id,
+        inventory_id=inventory_id,
+        quantity_needed=quantity_needed
+    )
+    db.add(link)
+    invalidate(db, "products")
+    db.commit()
+    db.refresh(link)
+    return _composition_item(link, inventory)
+
+
+@router.put("/{product_id}/composition/{composition_id}")
+async def update_product_composition(
+    product_id: int,
+    composition_id: int,
+    quantity_needed: float = Query(..., gt=0),
+    db: Session = Depends(get_session)
+):
+    """Изменить количество материала в составе продукта"""
+    link = _get_composition_link(db, product_id, composition_id)
+    link.quantity_needed = quantity_needed
+
+    db.add(link)
+    invalidate(db, "products")
+    db.commit()
+    db.refresh(link)
+    return _composition_item(link, db.get(Inventory, link.inventory_id))
+
+
+@router.delete("/{product_id}/composition/{composition_id}")
+async def delete_product_composition(
+    product_id: int,
+    composition_id: int,
+    db: Session = Depends(get_session)
+):
+    """Удалить материал из состава продукта"""
+    link = _get_composition_link(db, product_id, composition_id)
+
+    db.delete(link)
+    invalidate(db, "products")
     db.commit()
-    return {"message": "Product deleted successfully"}
\ No newline at end of file
+    return {"message": "Composition item deleted successfully"}
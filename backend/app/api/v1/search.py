@@ -0,0 +1,42 @@
+"""
+Search API router for CRM Florist System
+Полнотекстовый поиск по клиентам, продуктам и заказам
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from typing import Optional
+from sqlmodel import Session
+
+from app.models import Client, Product, Order
+from app.db import get_session
+from app.services import search as fulltext
+
+router = APIRouter()
+
+SEARCH_MODELS = {
+    "clients": Client,
+    "products": Product,
+    "orders": Order,
+}
+
+
+@router.get("/")
+async def search_all(
+    q: str = Query(..., min_length=1),
+    types: Optional[str] = Query(None, description="clients,products,orders"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_session)
+):
+    """Полнотекстовый поиск, результаты отсортированы по релевантности"""
+    if not fulltext.is_supported(db):
+        raise HTTPException(status_code=501, detail="Full-text search is not supported by this database")
+
+    requested = [name.strip() for name in types.split(",")] if types else list(SEARCH_MODELS)
+    unknown = [name for name in requested if name not in SEARCH_MODELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown search types: {unknown}")
+
+    return {
+        name: fulltext.search(db, SEARCH_MODELS[name], q, limit)
+        for name in requested
+    }
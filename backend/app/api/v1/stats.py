@@ -3,40 +3,59 @@ Statistics API router for CRM Florist System
 Compatible with working SQLModel API structure
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 from sqlmodel import Session, select, func
 
 from app.models import (
-    Client, Product, Order, OrderStatus, Inventory
+    Client, Product, Order, OrderStatus, DailySales, LowStockItem
 )
+from app.core.cache import TTLCache
+from app.core.config import COHORT_CACHE_TTL, DASHBOARD_CACHE_TTL
+from app.core.timebuckets import bucket_case, buckets, floor, local_range, local_today
 from app.db import get_session
+from app.services.analytics_export import export_analytics
+from app.services.cohorts import cohort_report
+from app.services.product_analytics import product_analytics
+from app.services.sales_rollup import sales_orders
+from app.services.workload import workload_report
 
 router = APIRouter()
 
+# Дашборд открыт на всех терминалах; записи сбрасывают кэш, TTL — страховка
+dashboard_cache = TTLCache(
+    "dashboard",
+    namespaces=("orders", "clients", "products", "inventory", "stock"),
+    maxsize=2,
+    ttl=DASHBOARD_CACHE_TTL
+)
 
-@router.get("/dashboard")
-async def get_dashboard_stats(db: Session = Depends(get_session)):
-    """Получить статистику для дашборда"""
-    today = datetime.now().date()
+# Аналитика продуктов обновляется на дашборде вживую, поэтому тот же TTL
+products_cache = TTLCache(
+    "product_analytics",
+    namespaces=("orders", "products"),
+    maxsize=32,
+    ttl=DASHBOARD_CACHE_TTL
+)
 
-    # Общее количество заказов
-    total_orders = db.exec(select(func.count()).select_from(Order)).one()
+# Когорты — тяжелый проход по всем заказам: только TTL, без сброса на каждую запись
+cohorts_cache = TTLCache("cohorts", namespaces=(), maxsize=1, ttl=COHORT_CACHE_TTL)
 
-    # Заказы за сегодня
-    today_orders = db.exec(
-        select(func.count()).select_from(Order)
-        .where(func.date(Order.created_at) == today)
-    ).one()
 
-    # Общее количество клиентов
-    total_clients = db.exec(select(func.count()).select_from(Client)).one()
+def _dashboard(db: Session, today: date) -> dict:
+    """Счетчики дашборда двумя запросами: скалярные подзапросы и GROUP BY по статусам"""
+    def count_of(model, *conditions):
+        return select(func.count()).select_from(model).where(*conditions).scalar_subquery()
 
-    # Общее количество продуктов
-    total_products = db.exec(select(func.count()).select_from(Product)).one()
+    today_orders, total_clients, total_products, low_stock_items = db.exec(select(
+        # Сегодня по времени магазина — UTC-диапазон по индексу created_at
+        count_of(Order, *local_range(Order.created_at, today, today)),
+        count_of(Client),
+        count_of(Product),
+        count_of(LowStockItem),
+    )).one()
 
-    # Статистика по статусам
     status_stats = db.exec(
         select(Order.status, func.count())
         .select_from(Order)
@@ -44,48 +63,147 @@ async def get_dashboard_stats(db: Session = Depends(get_session)):
     ).all()
 
     return {
-        "total_orders": total_orders,
+        "total_orders": sum(count for _, count in status_stats),
         "today_orders": today_orders,
         "total_clients": total_clients,
         "total_products": total_products,
         "orders_by_status": {status: count for status, count in status_stats},
-        "low_stock_items": db.exec(
-            select(func.count()).select_from(Inventory)
-            .where(
-                (Inventory.min_quantity.isnot(None)) &
-                (Inventory.quantity <= Inventory.min_quantity)
-            )
-        ).one()
+        "low_stock_items": low_stock_items
     }
 
 
+@router.get("/dashboard")
+async def get_dashboard_stats(db: Session = Depends(get_session)):
+    """Получить статистику для дашборда"""
+    today = local_today()
+    return dashboard_cache.get_or_load(today, lambda: _dashboard(db, today))
+
+
 @router.get("/sales")
 async def get_sales_stats(
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$"),
     db: Session = Depends(get_session)
 ):
-    """Получить статистику продаж"""
-    query = select(
-        func.date(Order.delivery_date).label("date"),
-        func.count(Order.id).label("orders_count"),
-        func.sum(Order.total_price).label("total_revenue")
-    ).select_from(Order).where(Order.status != OrderStatus.CANCELED)
+    """
+    Получить статистику продаж по интервалам времени магазина.
+    Дни, недели и месяцы собираются из дневной сводки, часы — из заказов.
+    """
+    if granularity == "hour":
+        return _hourly_sales(db, date_from or local_today(), date_to or date_from or local_today())
+
+    query = (
+        select(
+            DailySales.day,
+            func.sum(DailySales.orders_count),
+            func.sum(DailySales.revenue),
+            func.sum(DailySales.items_count)
+        )
+        .where(DailySales.status != OrderStatus.CANCELED)
+        .group_by(DailySales.day)
+        .order_by(DailySales.day)
+    )
 
     if date_from:
-        query = query.where(Order.delivery_date >= datetime.combine(date_from, datetime.min.time()))
+        query = query.where(DailySales.day >= date_from)
 
     if date_to:
-        query = query.where(Order.delivery_date <= datetime.combine(date_to, datetime.max.time()))
-
-    query = query.group_by(func.date(Order.delivery_date)).order_by("date")
-    sales_data = db.exec(query).all()
+        query = query.where(DailySales.day <= date_to)
+
+    sales = {}
+    for day, orders_count, revenue, items_count in db.exec(query).all():
+        bucket = floor(datetime.combine(day, time.min), granularity).date()
+        totals = sales.setdefault(bucket, {"date": bucket, "orders_count": 0, "total_revenue": 0, "items_count": 0})
+        totals["orders_count"] += orders_count
+        totals["total_revenue"] += revenue or 0
+        totals["items_count"] += items_count or 0
+
+    return list(sales.values())
+
+
+def _hourly_sales(db: Session, date_from: date, date_to: date) -> list:
+    """Продажи по часам: UTC-диапазон по индексу delivery_date и CASE по интервалам"""
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    try:
+        hours = buckets(date_from, date_to, "hour")
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    orders = sales_orders(hours[0].utc_start, hours[-1].utc_end)
+    hour = bucket_case(orders.c.delivery_date, hours)
+    rows = db.exec(
+        select(
+            hour,
+            func.count(),
+            func.sum(orders.c.total_price),
+            func.sum(orders.c.items_count)
+        )
+        .where(orders.c.status != OrderStatus.CANCELED)
+        .group_by(hour)
+        .order_by(hour)
+    ).all()
 
     return [
         {
-            "date": row[0],
-            "orders_count": row[1],
-            "total_revenue": row[2] or 0
+            "date": hours[index].start,
+            "orders_count": orders_count,
+            "total_revenue": revenue or 0,
+            "items_count": items_count or 0
         }
-        for row in sales_data
-    ]
\ No newline at end of file
+        for index, orders_count, revenue, items_count in rows
+    ]
+
+
+@router.get("/products")
+async def get_product_stats(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_session)
+):
+    """Топ продуктов, доли категорий и средний чек (по умолчанию за последние 30 дней)"""
+    date_to = date_to or local_today()
+    date_from = date_from or date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    return products_cache.get_or_load(
+        (date_from, date_to, limit),
+        lambda: product_analytics(db, date_from, date_to, limit)
+    )
+
+
+@router.get("/workload")
+async def get_workload_stats(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_session)
+):
+    """Нагрузка исполнителей: заказы по статусам и дням доставки (по умолчанию неделя вперед)"""
+    date_from = date_from or local_today()
+    date_to = date_to or date_from + timedelta(days=6)
+    try:
+        executors = workload_report(db, date_from, date_to)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    return {"date_from": date_from, "date_to": date_to, "executors": executors}
+
+
+@router.get("/cohorts")
+async def get_cohort_stats(db: Session = Depends(get_session)):
+    """Месячные когорты клиентов, повторные покупки и интервалы между ними"""
+    return cohorts_cache.get_or_load("all", lambda: cohort_report(db))
+
+
+@router.post("/export")
+async def export_for_analytics(
+    format: str = Query("parquet", description="parquet или arrow"),
+    full: bool = Query(False, description="Перезаписать все месяцы, а не только измененные"),
+    db: Session = Depends(get_session)
+):
+    """Выгрузка заказов, позиций и справочников в ANALYTICS_EXPORT_DIR (Parquet / Arrow IPC)"""
+    try:
+        return export_analytics(db, file_format=format, full=full)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
@@ -0,0 +1,146 @@
+"""
+In-process caches with cross-worker invalidation
+LRU-кэш с TTL в памяти процесса. Каждый кэш подписан на пространства
+имен данных ("products", "inventory", ...). Запись данных вызывает
+invalidate(): локальные кэши сбрасываются сразу, а версия пространства
+имен в таблице cache_versions увеличивается в той же транзакции. Другие
+воркеры сверяют версии не чаще раза в CACHE_SYNC_SECONDS и сбрасывают
+свои кэши, если версия изменилась.
+
+Кроме кэшей на пространства имен можно подписать произвольный
+обработчик (subscribe), например для сброса вычисленных в памяти структур.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Tuple
+
+from sqlalchemy import update, insert
+from sqlmodel import Session, select
+
+from app.core.config import CACHE_SYNC_SECONDS
+from app.db import engine
+from app.models import CacheVersion
+
+_registry: List["TTLCache"] = []
+_subscribers: List[Tuple[Tuple[str, ...], Callable[[], None]]] = []
+_known_versions: Dict[str, int] = {}
+_sync_lock = threading.Lock()
+_last_sync = 0.0
+_synced = False
+
+
+class TTLCache:
+    """LRU-кэш с ограничением по размеру и времени жизни записей"""
+
+    def __init__(self, name: str, namespaces: Iterable[str], maxsize: int = 256, ttl: float = 300):
+        self.name = name
+        self.namespaces = tuple(namespaces)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        _registry.append(self)
+        subscribe(self.namespaces, self.clear)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Вернуть значение из кэша или загрузить и сохранить его"""
+        sync_versions()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "name": self.name,
+            "namespaces": list(self.namespaces),
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+        }
+
+
+def subscribe(namespaces: Iterable[str], callback: Callable[[], None]) -> None:
+    """Вызывать callback при каждой инвалидации одного из пространств имен"""
+    _subscribers.append((tuple(namespaces), callback))
+
+
+def _clear_namespaces(namespaces: Iterable[str]) -> None:
+    namespaces = set(namespaces)
+    for subscribed, callback in _subscribers:
+        if namespaces.intersection(subscribed):
+            callback()
+
+
+def invalidate(session: Session, *namespaces: str) -> None:
+    """
+    Сбросить кэши пространств имен после записи данных.
+    Вызывается до commit: версия в cache_versions меняется в той же
+    транзакции, что и данные, и другие воркеры увидят ее после commit.
+    """
+    now = datetime.utcnow()
+    for namespace in namespaces:
+        bumped = session.execute(
+            update(CacheVersion)
+            .where(CacheVersion.namespace == namespace)
+            .values(version=CacheVersion.version + 1, updated_at=now)
+        ).rowcount
+        if not bumped:
+            session.execute(insert(CacheVersion).values(namespace=namespace, version=1, updated_at=now))
+    _clear_namespaces(namespaces)
+
+
+def sync_versions(force: bool = False) -> None:
+    """Сверить версии с БД и сбросить кэши, измененные другими воркерами"""
+    global _last_sync, _synced
+    if not force and time.monotonic() - _last_sync < CACHE_SYNC_SECONDS:
+        return
+
+    with _sync_lock:
+        if not force and time.monotonic() - _last_sync < CACHE_SYNC_SECONDS:
+            return
+        with Session(engine) as session:
+            versions = dict(session.exec(select(CacheVersion.namespace, CacheVersion.version)).all())
+        # До первой сверки локальные кэши пусты, сбрасывать нечего
+        changed = [
+            namespace for namespace, version in versions.items()
+            if _synced and _known_versions.get(namespace, 0) != version
+        ]
+        _known_versions.update(versions)
+        _synced = True
+        _last_sync = time.monotonic()
+
+    if changed:
+        _clear_namespaces(changed)
+
+
+def cache_stats() -> List[Dict[str, Any]]:
+    """Счетчики всех кэшей процесса"""
+    return [cache.stats() for cache in _registry]
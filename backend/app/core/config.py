@@ -0,0 +1,77 @@
+"""
+Application settings for CRM Florist System
+Values can be overridden with environment variables
+"""
+import os
+
+
+# Архивация заказов: завершенные и отмененные заказы старше N дней
+# переносятся в архивные таблицы пачками
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# Индекс телефонов для поиска звонящего: полная перезагрузка из БД
+# не реже, чем раз в N секунд (изменения других воркеров)
+PHONE_INDEX_REFRESH_SECONDS = int(os.getenv("PHONE_INDEX_REFRESH_SECONDS", "60"))
+
+# Импорт клиентов: количество строк в одном INSERT ... ON CONFLICT
+# и максимум ошибок в отчете
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "1000"))
+
+# Поиск дубликатов клиентов: блоки крупнее N записей (частые имена)
+# не сравниваются попарно; пары ниже порога не сохраняются
+DEDUP_MAX_BLOCK_SIZE = int(os.getenv("DEDUP_MAX_BLOCK_SIZE", "50"))
+DEDUP_MIN_SCORE = float(os.getenv("DEDUP_MIN_SCORE", "0.75"))
+
+# Кэши в памяти процесса: как часто сверять версии с БД
+# (изменения, сделанные другими воркерами uvicorn)
+CACHE_SYNC_SECONDS = float(os.getenv("CACHE_SYNC_SECONDS", "1"))
+
+# Кэш каталога продуктов
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "512"))
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "300"))
+
+# Фасеты каталога: границы ценовых диапазонов (тенге), через запятую
+PRICE_FACET_EDGES = [
+    float(edge) for edge in os.getenv("PRICE_FACET_EDGES", "10000,20000,30000,50000").split(",")
+]
+
+# Складской журнал: снимок остатков всех позиций каждые N транзакций,
+# чтобы остаток на дату считался от снимка, а не от начала журнала
+INVENTORY_SNAPSHOT_INTERVAL = int(os.getenv("INVENTORY_SNAPSHOT_INTERVAL", "1000"))
+
+# Поток оповещений о низком остатке: как часто проверять новые события
+LOW_STOCK_POLL_SECONDS = float(os.getenv("LOW_STOCK_POLL_SECONDS", "2"))
+
+# Прогноз потребности в материалах: окно скользящего среднего (дней)
+DEMAND_HISTORY_DAYS = int(os.getenv("DEMAND_HISTORY_DAYS", "28"))
+
+# Дашборд: время жизни кэша (сек); записи данных сбрасывают его раньше
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+
+# Часовой пояс магазинов: отчеты по часам, дням, неделям и месяцам
+# считаются по местному времени (в БД время хранится в UTC)
+SHOP_TIMEZONE = os.getenv("SHOP_TIMEZONE", "Asia/Almaty")
+
+# Автоназначение исполнителей: полная перезагрузка нагрузки из БД
+# не реже, чем раз в N секунд (назначения других воркеров)
+WORKLOAD_REFRESH_SECONDS = int(os.getenv("WORKLOAD_REFRESH_SECONDS", "60"))
+
+# Когортный анализ: строк заказов в одной пачке (ограничивает память),
+# время жизни результата (сек)
+COHORT_CHUNK_SIZE = int(os.getenv("COHORT_CHUNK_SIZE", "50000"))
+COHORT_CACHE_TTL = int(os.getenv("COHORT_CACHE_TTL", "3600"))
+
+# Праздники (MM-DD через запятую) и окно перед ними (дней) для анализа
+# интервалов между покупками
+HOLIDAYS = os.getenv("HOLIDAYS", "02-14,03-08,12-31").split(",")
+HOLIDAY_WINDOW_DAYS = int(os.getenv("HOLIDAY_WINDOW_DAYS", "14"))
+
+# Выгрузка заказов: строк на одну пачку серверного курсора
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Выгрузка для аналитики (Parquet / Arrow IPC): каталог на сервере
+# и строк на одну пачку при чтении из БД
+ANALYTICS_EXPORT_DIR = os.getenv("ANALYTICS_EXPORT_DIR", "./exports")
+ANALYTICS_EXPORT_BATCH_SIZE = int(os.getenv("ANALYTICS_EXPORT_BATCH_SIZE", "10000"))
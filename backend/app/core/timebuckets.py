@@ -0,0 +1,113 @@
+"""
+Shop-local time buckets for CRM Florist System
+Время в БД хранится в UTC без часового пояса, а отчеты нужны по часам,
+дням, неделям и месяцам магазина (SHOP_TIMEZONE). Границы интервалов
+переводятся в UTC заранее, поэтому запросы фильтруют индексированные
+колонки полуоткрытыми диапазонами (>= начало, < конец), а не date(колонка).
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, NamedTuple, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import and_, case, literal
+
+from app.core.config import SHOP_TIMEZONE
+
+SHOP_TZ = ZoneInfo(SHOP_TIMEZONE)
+GRANULARITIES = ("hour", "day", "week", "month")
+
+# Больше интервалов в одном CASE не строим: такой отчет нужно сузить
+MAX_BUCKETS = 1000
+
+
+class Bucket(NamedTuple):
+    """Интервал: начало по времени магазина и полуоткрытые границы в UTC"""
+    start: datetime
+    utc_start: datetime
+    utc_end: datetime
+
+
+def shop_now() -> datetime:
+    """Текущее время магазина (без часового пояса)"""
+    return datetime.now(SHOP_TZ).replace(tzinfo=None)
+
+
+def local_today() -> date:
+    return shop_now().date()
+
+
+def to_utc(local: datetime) -> datetime:
+    """Местное время магазина -> UTC без часового пояса, как хранится в БД"""
+    return local.replace(tzinfo=SHOP_TZ).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_local(utc: datetime) -> datetime:
+    """UTC без часового пояса из БД -> местное время магазина"""
+    return utc.replace(tzinfo=timezone.utc).astimezone(SHOP_TZ).replace(tzinfo=None)
+
+
+def floor(moment: datetime, granularity: str) -> datetime:
+    """Начало интервала, в который попадает местное время moment"""
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = datetime.combine(moment.date(), time.min)
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def _next(start: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return start + timedelta(hours=1)
+    if granularity == "day":
+        return start + timedelta(days=1)
+    if granularity == "week":
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def buckets(first: date, last: date, granularity: str) -> List[Bucket]:
+    """
+    Интервалы, покрывающие местные дни first..last включительно.
+    Raises:
+        ValueError: неизвестная гранулярность или слишком много интервалов
+    """
+    start = floor(datetime.combine(first, time.min), granularity)
+    end = datetime.combine(last + timedelta(days=1), time.min)
+    result = []
+    while start < end:
+        following = _next(start, granularity)
+        result.append(Bucket(start, to_utc(start), to_utc(following)))
+        if len(result) > MAX_BUCKETS:
+            raise ValueError(f"Too many {granularity} buckets in range, max {MAX_BUCKETS}")
+        start = following
+    return result
+
+
+def local_range(column, first: Optional[date] = None, last: Optional[date] = None) -> list:
+    """Условия WHERE: UTC-колонка попадает в местные дни first..last включительно"""
+    conditions = []
+    if first is not None:
+        conditions.append(column >= to_utc(datetime.combine(first, time.min)))
+    if last is not None:
+        conditions.append(column < to_utc(datetime.combine(last + timedelta(days=1), time.min)))
+    return conditions
+
+
+def bucket_case(column, intervals: Sequence[Bucket], labels: Optional[Sequence] = None):
+    """
+    CASE: метка интервала, в который попадает UTC-колонка (по умолчанию номер),
+    NULL вне интервалов. Для GROUP BY вместо date(колонка).
+    """
+    labels = range(len(intervals)) if labels is None else labels
+    return case(
+        *[
+            (and_(column >= bucket.utc_start, column < bucket.utc_end), literal(label))
+            for bucket, label in zip(intervals, labels)
+        ],
+        else_=None
+    )
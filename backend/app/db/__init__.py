@@ -1,4 +1,4 @@
 """Database module"""
-from .session import engine, get_session, create_db_and_tables
+from .session import engine, get_session, create_db_and_tables, dialect_insert
 
-__all__ = ["engine", "get_session", "create_db_and_tables"]
\ No newline at end of file
+__all__ = ["engine", "get_session", "create_db_and_tables", "dialect_insert"]
\ No newline at end of file
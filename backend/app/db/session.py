@@ -3,13 +3,19 @@ Database session management for SQLModel CRM application.
 """
 
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateTable
 from typing import Generator
 
 # Import all models to ensure they are registered with SQLModel
 from app.models import (
-    User, Client, Product, ProductInventory,
-    Inventory, Order, OrderItem, OrderHistory
+    User, Client, ClientStats, DuplicateCandidate, Product, ProductInventory,
+    Inventory, InventoryTransaction, InventorySnapshot, StockReservation,
+    LowStockItem, LowStockEvent, InventoryAudit, InventoryAuditItem,
+    Order, OrderItem, OrderHistory, DailySales,
+    ArchivedOrder, ArchivedOrderItem, ArchivedOrderHistory, CacheVersion, ExportPartition
 )
+from app.services.search import ensure_search_index
 
 
 # Database URL for SQLite - using existing database with data
@@ -29,6 +35,90 @@ def create_db_and_tables() -> None:
     Should be called once during application startup.
     """
     SQLModel.metadata.create_all(engine)
+    ensure_autoincrement()
+    ensure_indexes()
+    ensure_search_index(engine)
+
+
+# Живые таблицы заказов и их архивы: id не должны повторяться между ними
+ARCHIVED_TABLES = (
+    (Order, ArchivedOrder),
+    (OrderItem, ArchivedOrderItem),
+    (OrderHistory, ArchivedOrderHistory),
+)
+
+
+def ensure_autoincrement() -> None:
+    """
+    Rebuild order tables of an existing SQLite database with AUTOINCREMENT.
+    Without it SQLite reuses the id of the last archived order for a new one,
+    and the next archive run fails on the unique id in the archive table.
+    The id counter is moved past the largest id of the archive as well.
+    Indexes and search triggers are recreated by ensure_indexes()
+    and ensure_search_index() afterwards.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as connection:
+        for live_model, archive_model in ARCHIVED_TABLES:
+            table = live_model.__table__
+            ddl = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+            ).scalar()
+            if ddl is None or "AUTOINCREMENT" in ddl.upper():
+                continue
+
+            existing = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+            columns = ", ".join(column.name for column in table.columns if column.name in existing)
+            rebuilt = f"{table.name}_rebuild"
+            create = str(CreateTable(table).compile(dialect=engine.dialect))
+            connection.exec_driver_sql(
+                create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1)
+            )
+            connection.exec_driver_sql(
+                f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}"
+            )
+            connection.exec_driver_sql(f"DROP TABLE {table.name}")
+            connection.exec_driver_sql(f"ALTER TABLE {rebuilt} RENAME TO {table.name}")
+
+            archive = archive_model.__tablename__
+            connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = ?", (table.name,))
+            connection.exec_driver_sql(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES "
+                f"(?, MAX(COALESCE((SELECT MAX(id) FROM {table.name}), 0), "
+                f"COALESCE((SELECT MAX(id) FROM {archive}), 0)))",
+                (table.name,)
+            )
+            print(f"✅ Table {table.name} rebuilt with AUTOINCREMENT")
+
+
+def ensure_indexes() -> None:
+    """
+    Create indexes declared on models that are missing in an existing database.
+    create_all() only creates indexes together with new tables, so indexes
+    added to existing models later would otherwise never reach old databases.
+    """
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except IntegrityError:
+                # Уникальный индекс не создать, пока в данных есть дубликаты
+                print(f"⚠️ Index {index.name} not created: duplicate values in {table.name}")
+
+
+def dialect_insert(session: Session, model):
+    """
+    INSERT для диалекта текущей БД с поддержкой on_conflict_do_update().
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported for {dialect}")
+    return insert(model)
 
 
 def get_session() -> Generator[Session, None, None]:
@@ -6,8 +6,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1 import api_router
-from app.db import create_db_and_tables
+from sqlmodel import Session
+
+from app.db import create_db_and_tables, engine
 from app.seed_data import create_seed_data
+from app.services.client_stats import ensure_client_stats
+from app.services.low_stock import track_low_stock
+from app.services.reservations import ensure_reservations
+from app.services.sales_rollup import ensure_daily_sales
+from app.services.stock_ledger import ensure_opening_balances
 
 # Create FastAPI app
 app = FastAPI(
@@ -41,6 +48,22 @@ async def startup_event():
     create_seed_data()
     print("✅ Seed data initialized")
 
+    # Агрегаты клиентов и дневные продажи для базы, созданной до их появления
+    with Session(engine) as session:
+        ensure_client_stats(session)
+        ensure_daily_sales(session)
+
+    # Начальные остатки в журнале и резервы открытых заказов для базы,
+    # заполненной до их появления
+    with Session(engine) as session:
+        ensure_opening_balances(session)
+        ensure_reservations(session)
+
+    # Остатки могли измениться в обход журнала (начальные данные, импорт)
+    with Session(engine) as session:
+        track_low_stock(session)
+        session.commit()
+
 # Root endpoint
 @app.get("/")
 async def root():
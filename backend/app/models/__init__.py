@@ -4,14 +4,20 @@ SQLModel Models for CRM Florist System
 """
 
 # Import enums
-from .enums import ClientType, OrderStatus, ProductCategory
+from .enums import ClientType, OrderStatus, ProductCategory, InventoryTransactionType
 
 # Import models
 from .user import User
-from .client import Client
+from .client import Client, ClientStats, DuplicateCandidate
 from .product import Product, ProductInventory
-from .inventory import Inventory
-from .order import Order, OrderItem, OrderHistory
+from .inventory import (
+    Inventory, InventoryTransaction, InventorySnapshot, StockReservation,
+    LowStockItem, LowStockEvent, InventoryAudit, InventoryAuditItem
+)
+from .order import Order, OrderItem, OrderHistory, DailySales
+from .archive import ArchivedOrder, ArchivedOrderItem, ArchivedOrderHistory
+from .cache import CacheVersion
+from .export import ExportPartition
 
 # Export all models and enums
 __all__ = [
@@ -19,14 +25,30 @@ __all__ = [
     "ClientType",
     "OrderStatus",
     "ProductCategory",
+    "InventoryTransactionType",
 
     # Models
     "User",
     "Client",
+    "ClientStats",
+    "DuplicateCandidate",
     "Product",
     "ProductInventory",
     "Inventory",
+    "InventoryTransaction",
+    "InventorySnapshot",
+    "StockReservation",
+    "LowStockItem",
+    "LowStockEvent",
+    "InventoryAudit",
+    "InventoryAuditItem",
     "Order",
     "OrderItem",
     "OrderHistory",
+    "DailySales",
+    "ArchivedOrder",
+    "ArchivedOrderItem",
+    "ArchivedOrderHistory",
+    "CacheVersion",
+    "ExportPartition",
 ]
\ No newline at end of file
@@ -0,0 +1,51 @@
+"""
+Archive models for CRM Florist System
+Холодное хранилище для старых завершенных и отмененных заказов
+"""
+from typing import Optional
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+from .enums import OrderStatus
+
+
+class ArchivedOrder(SQLModel, table=True):
+    """Архивная копия заказа (те же колонки, что и в orders)"""
+    __tablename__ = "orders_archive"
+
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    client_id: int = Field(foreign_key="clients.id", index=True)
+    recipient_id: int = Field(foreign_key="clients.id", index=True)
+    executor_id: Optional[int] = Field(default=None, foreign_key="users.id")
+    status: OrderStatus
+    delivery_date: datetime = Field(index=True)
+    delivery_address: str
+    delivery_time_range: Optional[str] = None
+    total_price: Optional[float] = None
+    comment: Optional[str] = None
+    created_at: datetime
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ArchivedOrderItem(SQLModel, table=True):
+    """Архивная копия позиции заказа"""
+    __tablename__ = "order_items_archive"
+
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    order_id: int = Field(index=True)
+    product_id: int = Field(foreign_key="products.id")
+    quantity: int = Field(default=1)
+    price: float
+
+
+class ArchivedOrderHistory(SQLModel, table=True):
+    """Архивная копия истории изменений заказа"""
+    __tablename__ = "order_history_archive"
+
+    id: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    order_id: int = Field(index=True)
+    action: str
+    old_status: Optional[str] = None
+    new_status: Optional[str] = None
+    comment: Optional[str] = None
+    changed_by_id: Optional[int] = Field(default=None, foreign_key="users.id")
+    created_at: datetime
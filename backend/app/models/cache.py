@@ -0,0 +1,14 @@
+"""
+Cache version model for CRM Florist System
+"""
+from datetime import datetime
+from sqlmodel import Field, SQLModel
+
+
+class CacheVersion(SQLModel, table=True):
+    """Версия пространства имен кэша; увеличивается при каждой записи данных"""
+    __tablename__ = "cache_versions"
+
+    namespace: str = Field(primary_key=True)
+    version: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
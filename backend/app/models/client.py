@@ -3,6 +3,7 @@ Client model for CRM Florist System
 """
 from typing import Optional, List
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 from .enums import ClientType
 
@@ -10,10 +11,14 @@ from .enums import ClientType
 class Client(SQLModel, table=True):
     """Модель клиента (заказчик/получатель)"""
     __tablename__ = "clients"
+    __table_args__ = (
+        # Уникальность телефона нужна для INSERT ... ON CONFLICT (phone) при импорте
+        Index("uq_clients_phone", "phone", unique=True),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     name: Optional[str] = None  # Имя опционально
-    phone: str = Field(index=True)  # +7XXXXXXXXXX format
+    phone: str  # +7XXXXXXXXXX format
     email: Optional[str] = None
     address: Optional[str] = None
     client_type: ClientType = Field(default=ClientType.BOTH)
@@ -34,4 +39,26 @@ class Client(SQLModel, table=True):
             "foreign_keys": "Order.recipient_id",
             "overlaps": "orders_as_client,client"
         }
-    )
\ No newline at end of file
+    )
+
+class ClientStats(SQLModel, table=True):
+    """Агрегаты заказов клиента (как заказчика) для сортировки списка клиентов"""
+    __tablename__ = "client_stats"
+
+    client_id: int = Field(foreign_key="clients.id", primary_key=True)
+    orders_count: int = Field(default=0, index=True)  # без отмененных
+    lifetime_value: float = Field(default=0, index=True)  # сумма total_price без отмененных
+    last_order_at: Optional[datetime] = Field(default=None, index=True)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class DuplicateCandidate(SQLModel, table=True):
+    """Пара клиентов, похожих на дубликаты (результат поиска дубликатов)"""
+    __tablename__ = "client_duplicate_candidates"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    client_id: int = Field(foreign_key="clients.id", index=True)
+    duplicate_id: int = Field(foreign_key="clients.id", index=True)
+    score: float = Field(index=True)
+    reasons: str  # "phone,email,name"
+    detected_at: datetime = Field(default_factory=datetime.utcnow)
@@ -24,4 +24,11 @@ class OrderStatus(str, Enum):
 class ProductCategory(str, Enum):
     BOUQUET = "букет"
     COMPOSITION = "композиция"
-    POTTED = "горшечный"
\ No newline at end of file
+    POTTED = "горшечный"
+
+class InventoryTransactionType(str, Enum):
+    SUPPLY = "supply"            # поступление
+    CONSUMPTION = "consumption"  # расход на заказы
+    WASTE = "waste"              # списание
+    ADJUSTMENT = "adjustment"    # ручная корректировка
+    AUDIT = "audit"              # результат инвентаризации
@@ -0,0 +1,15 @@
+"""
+Analytics export tracking model for CRM Florist System
+"""
+from datetime import datetime
+from typing import Optional
+from sqlmodel import Field, SQLModel
+
+
+class ExportPartition(SQLModel, table=True):
+    """Месяц доставки в выгрузке для аналитики: когда менялся и когда выгружен"""
+    __tablename__ = "export_partitions"
+
+    month: str = Field(primary_key=True)  # "YYYY-MM" по времени магазина
+    changed_at: datetime = Field(default_factory=datetime.utcnow)
+    exported_at: Optional[datetime] = None
@@ -1,9 +1,11 @@
 """
-Inventory model for CRM Florist System
+Inventory models for CRM Florist System
 """
 from typing import Optional, List
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
+from .enums import InventoryTransactionType
 
 
 class Inventory(SQLModel, table=True):
@@ -12,11 +14,100 @@ class Inventory(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
-    quantity: float
+    quantity: float  # текущий остаток: сумма движений из inventory_transactions
     unit: str  # 'шт', 'м', 'кг'
     min_quantity: Optional[float] = None  # для предупреждений о низком запасе
     price_per_unit: Optional[float] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     # Relationships
-    product_inventories: List["ProductInventory"] = Relationship(back_populates="inventory")
\ No newline at end of file
+    product_inventories: List["ProductInventory"] = Relationship(back_populates="inventory")
+
+
+class InventoryTransaction(SQLModel, table=True):
+    """Движение по складу. Журнал только дополняется, записи не изменяются"""
+    __tablename__ = "inventory_transactions"
+    __table_args__ = (
+        Index("ix_inventory_transactions_inventory_id_id", "inventory_id", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    inventory_id: int = Field(foreign_key="inventory.id")
+    transaction_type: InventoryTransactionType
+    quantity: float  # со знаком: приход > 0, расход < 0
+    balance_after: float
+    comment: Optional[str] = None
+    reference_type: Optional[str] = None  # 'order', 'audit'
+    reference_id: Optional[int] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class InventorySnapshot(SQLModel, table=True):
+    """Остаток позиции после транзакции last_transaction_id (периодический снимок)"""
+    __tablename__ = "inventory_snapshots"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    inventory_id: int = Field(foreign_key="inventory.id")
+    balance: float
+    last_transaction_id: int = Field(index=True)
+    taken_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class StockReservation(SQLModel, table=True):
+    """Материалы, обещанные заказу к дате доставки, но еще не списанные"""
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        Index("ix_stock_reservations_inventory_id_delivery_date", "inventory_id", "delivery_date"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    order_id: int = Field(index=True)
+    inventory_id: int = Field(foreign_key="inventory.id")
+    quantity: float
+    delivery_date: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class LowStockItem(SQLModel, table=True):
+    """Позиции, остаток которых сейчас не выше минимального (поддерживается при каждом движении)"""
+    __tablename__ = "low_stock_items"
+
+    inventory_id: int = Field(foreign_key="inventory.id", primary_key=True)
+    since: datetime = Field(default_factory=datetime.utcnow)
+
+
+class LowStockEvent(SQLModel, table=True):
+    """Переход позиции через минимальный остаток: 'low' — ниже порога, 'recovered' — выше"""
+    __tablename__ = "low_stock_events"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    inventory_id: int = Field(index=True)
+    event: str
+    quantity: float
+    min_quantity: Optional[float] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class InventoryAudit(SQLModel, table=True):
+    """Сессия инвентаризации: 'in_progress' или 'completed'"""
+    __tablename__ = "inventory_audits"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: str = Field(default="in_progress", index=True)
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    completed_at: Optional[datetime] = None
+
+
+class InventoryAuditItem(SQLModel, table=True):
+    """Подсчитанное количество позиции и ожидаемый остаток на момент подсчета"""
+    __tablename__ = "inventory_audit_items"
+    __table_args__ = (
+        Index("uq_inventory_audit_items_audit_id_inventory_id", "audit_id", "inventory_id", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    audit_id: int = Field(foreign_key="inventory_audits.id")
+    inventory_id: int = Field(foreign_key="inventory.id")
+    expected_quantity: float
+    actual_quantity: float
+    counted_at: datetime = Field(default_factory=datetime.utcnow)
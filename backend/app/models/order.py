@@ -1,8 +1,9 @@
 """
-Order, OrderItem, and OrderHistory models for CRM Florist System
+Order, OrderItem, OrderHistory and DailySales models for CRM Florist System
 """
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel, Relationship
 from .enums import OrderStatus
 
@@ -10,18 +11,24 @@ from .enums import OrderStatus
 class Order(SQLModel, table=True):
     """Модель заказа"""
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_client_id_created_at", "client_id", "created_at"),
+        Index("ix_orders_recipient_id_created_at", "recipient_id", "created_at"),
+        # id архивированных заказов не должны достаться новым (см. orders_archive)
+        {"sqlite_autoincrement": True},
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     client_id: int = Field(foreign_key="clients.id")
     recipient_id: int = Field(foreign_key="clients.id")
     executor_id: Optional[int] = Field(default=None, foreign_key="users.id")
-    status: OrderStatus = Field(default=OrderStatus.NEW)
-    delivery_date: datetime
+    status: OrderStatus = Field(default=OrderStatus.NEW, index=True)
+    delivery_date: datetime = Field(index=True)
     delivery_address: str
     delivery_time_range: Optional[str] = None  # Время доставки, например "10:00-12:00"
     total_price: Optional[float] = None
     comment: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
 
     # Relationships
     client: Optional["Client"] = Relationship(
@@ -40,9 +47,10 @@ class Order(SQLModel, table=True):
 class OrderItem(SQLModel, table=True):
     """Модель позиции заказа"""
     __tablename__ = "order_items"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    order_id: int = Field(foreign_key="orders.id")
+    order_id: int = Field(foreign_key="orders.id", index=True)
     product_id: int = Field(foreign_key="products.id")
     quantity: int = Field(default=1)
     price: float
@@ -55,9 +63,10 @@ class OrderItem(SQLModel, table=True):
 class OrderHistory(SQLModel, table=True):
     """История изменений заказа"""
     __tablename__ = "order_history"
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    order_id: int = Field(foreign_key="orders.id")
+    order_id: int = Field(foreign_key="orders.id", index=True)
     action: str  # "status_changed", "created", "edited", etc.
     old_status: Optional[str] = None
     new_status: Optional[str] = None
@@ -67,4 +76,16 @@ class OrderHistory(SQLModel, table=True):
 
     # Relationships
     order: Optional[Order] = Relationship(back_populates="history_entries")
-    changed_by: Optional["User"] = Relationship()
\ No newline at end of file
+    changed_by: Optional["User"] = Relationship()
+
+
+class DailySales(SQLModel, table=True):
+    """Продажи за день по статусам (день доставки), включая архивные заказы"""
+    __tablename__ = "daily_sales"
+
+    day: date = Field(primary_key=True)  # день доставки по времени магазина
+    status: OrderStatus = Field(primary_key=True)
+    orders_count: int = Field(default=0)
+    revenue: float = Field(default=0)  # сумма total_price
+    items_count: int = Field(default=0)  # сумма количеств в позициях
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -30,8 +30,8 @@ class ProductInventory(SQLModel, table=True):
     __tablename__ = "product_inventory"
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    product_id: int = Field(foreign_key="products.id")
-    inventory_id: int = Field(foreign_key="inventory.id")
+    product_id: int = Field(foreign_key="products.id", index=True)
+    inventory_id: int = Field(foreign_key="inventory.id", index=True)
     quantity_needed: float
 
     # Relationships
@@ -7,7 +7,8 @@ from .client import (
     ClientBase,
     ClientCreate,
     ClientRead,
-    ClientUpdate
+    ClientUpdate,
+    ClientMergeRequest
 )
 
 from .product import (
@@ -24,7 +25,9 @@ from .inventory import (
     InventoryBase,
     InventoryCreate,
     InventoryRead,
-    InventoryUpdate
+    InventoryUpdate,
+    InventoryMovementRequest,
+    InventoryAuditCount
 )
 
 from .order import (
@@ -56,6 +59,7 @@ __all__ = [
     "ClientCreate",
     "ClientRead",
     "ClientUpdate",
+    "ClientMergeRequest",
 
     # Product schemas
     "ProductBase",
@@ -71,6 +75,8 @@ __all__ = [
     "InventoryCreate",
     "InventoryRead",
     "InventoryUpdate",
+    "InventoryMovementRequest",
+    "InventoryAuditCount",
 
     # Order schemas
     "OrderBase",
@@ -2,7 +2,7 @@
 Client schema models for API validation
 """
 
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from sqlmodel import SQLModel, Field
 from pydantic import validator
@@ -113,4 +113,9 @@ class ClientUpdate(SQLModel):
             valid_types = ["заказчик", "получатель", "оба"]
             if v not in valid_types:
                 raise ValueError(f"Client type must be one of: {valid_types}")
-        return v
\ No newline at end of file
+        return v
+
+
+class ClientMergeRequest(SQLModel):
+    """Schema for merging duplicate clients into one"""
+    source_ids: List[int] = Field(min_length=1)
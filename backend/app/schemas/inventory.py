@@ -70,4 +70,15 @@ class InventoryUpdate(SQLModel):
         """Validate unit of measurement if provided"""
         if v is not None and (not v or not v.strip()):
             raise ValueError("Unit of measurement cannot be empty")
-        return v.strip() if v else v
\ No newline at end of file
+        return v.strip() if v else v
+
+class InventoryMovementRequest(SQLModel):
+    """Schema for a stock movement: supply or write-off"""
+    quantity: float = Field(gt=0)
+    comment: Optional[str] = None
+
+
+class InventoryAuditCount(SQLModel):
+    """Schema for a counted quantity in an inventory audit"""
+    inventory_id: int = Field(gt=0)
+    actual_quantity: float = Field(ge=0)
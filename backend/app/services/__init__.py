@@ -0,0 +1,4 @@
+"""
+Service layer for CRM Florist System
+Фоновые задачи и бизнес-логика, общие для нескольких роутеров
+"""
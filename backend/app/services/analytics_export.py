@@ -0,0 +1,255 @@
+"""
+Columnar analytics export for CRM Florist System
+Выгрузка заказов, позиций, клиентов, продуктов и склада в Parquet или
+Arrow IPC для аналитиков вместо копирования файла БД.
+
+Заказы и позиции разбиты на партиции по месяцу доставки (по времени
+магазина): orders/delivery_month=YYYY-MM/data.parquet. Справочники
+(clients, products, inventory) выгружаются целиком одним файлом.
+Типы колонок берутся из моделей, строки читаются пачками (yield_per)
+и пишутся в файл пачками, поэтому память не зависит от объема данных.
+
+Запись заказа отмечает его месяц в export_partitions; инкрементальная
+выгрузка перезаписывает только месяцы, измененные после прошлой выгрузки.
+
+Запуск из командной строки:
+    python -m app.services.analytics_export [--format parquet|arrow] [--full] [--target ./exports]
+"""
+import argparse
+import json
+import os
+import shutil
+from datetime import date, datetime
+from enum import Enum
+from typing import Dict, Iterable, List
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, union_all
+from sqlmodel import Session, SQLModel, select, func
+
+from app.core.config import ANALYTICS_EXPORT_BATCH_SIZE, ANALYTICS_EXPORT_DIR
+from app.core.timebuckets import buckets, to_local
+from app.db import dialect_insert
+from app.models import (
+    ArchivedOrder, ArchivedOrderItem, Client, ExportPartition, Inventory, Order, OrderItem, Product
+)
+
+FORMATS = {"parquet": "data.parquet", "arrow": "data.arrow"}
+REFERENCE_TABLES = {"clients": Client, "products": Product, "inventory": Inventory}
+MANIFEST = "_manifest.json"
+
+
+def month_key(delivery_date: datetime) -> str:
+    """Партиция заказа: месяц доставки по времени магазина"""
+    return to_local(delivery_date).strftime("%Y-%m")
+
+
+def mark_changed(session: Session, delivery_dates: Iterable[datetime]) -> None:
+    """Отметить месяцы доставки как измененные. Не коммитит."""
+    months = sorted({month_key(value) for value in delivery_dates if value})
+    if not months:
+        return
+    statement = dialect_insert(session, ExportPartition)
+    statement = statement.on_conflict_do_update(
+        index_elements=["month"], set_={"changed_at": statement.excluded.changed_at}
+    )
+    now = datetime.utcnow()
+    session.execute(statement, [{"month": month, "changed_at": now} for month in months])
+
+
+def _arrow_schema(table):
+    import pyarrow as pa
+
+    def arrow_type(column):
+        if isinstance(column.type, Boolean):
+            return pa.bool_()
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        if isinstance(column.type, Float):
+            return pa.float64()
+        if isinstance(column.type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(column.type, Date):
+            return pa.date32()
+        return pa.string()  # строки и перечисления (по значению)
+
+    return pa.schema([pa.field(column.name, arrow_type(column)) for column in table.columns])
+
+
+def _plain(value):
+    return value.value if isinstance(value, Enum) else value
+
+
+def _write(session: Session, query, model: SQLModel, path: str, file_format: str, batch_size: int) -> int:
+    """
+    Записать результат запроса (колонки как в model) в файл пачками.
+    Файл пишется рядом и переименовывается, чтобы читатели не видели его частично.
+    Возвращает число строк; пустой результат файл не создает.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(model.__table__)
+    temporary = f"{path}.tmp"
+    writer = None
+    written = 0
+    try:
+        result = session.execute(query.execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            columns = list(zip(*rows))
+            batch = pa.record_batch(
+                [pa.array([_plain(value) for value in values], type=field.type)
+                 for values, field in zip(columns, schema)],
+                schema=schema
+            )
+            if writer is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writer = (pq.ParquetWriter(temporary, schema) if file_format == "parquet"
+                          else ipc.new_file(temporary, schema))
+            writer.write_table(pa.Table.from_batches([batch]))
+            written += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(temporary, path)
+    return written
+
+
+def _order_columns(model):
+    return [model.__table__.c[column.name] for column in Order.__table__.columns]
+
+
+def _item_columns(model):
+    return [model.__table__.c[column.name] for column in OrderItem.__table__.columns]
+
+
+def _month_queries(month: str):
+    """Запросы заказов и позиций месяца доставки (живые и архивные)"""
+    year, number = (int(part) for part in month.split("-"))
+    bucket = buckets(date(year, number, 1), date(year, number, 1), "month")[0]
+
+    def in_month(model):
+        return (model.delivery_date >= bucket.utc_start, model.delivery_date < bucket.utc_end)
+
+    orders = union_all(*[
+        select(*_order_columns(model)).where(*in_month(model))
+        for model in (Order, ArchivedOrder)
+    ]).subquery("export_orders")
+    items = union_all(*[
+        select(*_item_columns(item_model))
+        .join(order_model, order_model.id == item_model.order_id)
+        .where(*in_month(order_model))
+        for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+    ]).subquery("export_items")
+    return select(orders).order_by(orders.c.id), select(items).order_by(items.c.id)
+
+
+def _all_months(session: Session) -> List[str]:
+    bounds = [
+        session.exec(select(func.min(model.delivery_date), func.max(model.delivery_date))).one()
+        for model in (Order, ArchivedOrder)
+    ]
+    lows = [low for low, _ in bounds if low is not None]
+    highs = [high for _, high in bounds if high is not None]
+    if not lows:
+        return []
+    months = buckets(to_local(min(lows)).date(), to_local(max(highs)).date(), "month")
+    return [bucket.start.strftime("%Y-%m") for bucket in months]
+
+
+def _changed_months(session: Session) -> List[str]:
+    return list(session.exec(
+        select(ExportPartition.month)
+        .where(ExportPartition.exported_at.is_(None) | (ExportPartition.changed_at > ExportPartition.exported_at))
+        .order_by(ExportPartition.month)
+    ).all())
+
+
+def _read_manifest(target: str) -> Dict:
+    path = os.path.join(target, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as manifest:
+        return json.load(manifest)
+
+
+def export_analytics(
+    session: Session,
+    target: str = ANALYTICS_EXPORT_DIR,
+    file_format: str = "parquet",
+    full: bool = False,
+    batch_size: int = ANALYTICS_EXPORT_BATCH_SIZE
+) -> Dict:
+    """
+    Выгрузить данные в target. Без full перезаписываются только месяцы,
+    измененные после прошлой выгрузки (полная — если выгрузки в этом
+    формате в target еще не было).
+    Raises:
+        ValueError: неизвестный формат
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {file_format}")
+    started = datetime.utcnow()
+    file_name = FORMATS[file_format]
+    full = full or _read_manifest(target).get("format") != file_format
+    months = _all_months(session) if full else _changed_months(session)
+
+    rows = {"orders": 0, "order_items": 0}
+    for month in months:
+        orders_query, items_query = _month_queries(month)
+        for dataset, query, model in (("orders", orders_query, Order), ("order_items", items_query, OrderItem)):
+            directory = os.path.join(target, dataset, f"delivery_month={month}")
+            written = _write(session, query, model, os.path.join(directory, file_name), file_format, batch_size)
+            if not written:
+                # В месяце больше нет заказов: убираем устаревшую партицию
+                shutil.rmtree(directory, ignore_errors=True)
+            rows[dataset] += written
+
+    for dataset, model in REFERENCE_TABLES.items():
+        query = select(*model.__table__.columns).order_by(model.__table__.c.id)
+        rows[dataset] = _write(
+            session, query, model, os.path.join(target, dataset, file_name), file_format, batch_size
+        )
+
+    if months:
+        statement = dialect_insert(session, ExportPartition)
+        statement = statement.on_conflict_do_update(
+            index_elements=["month"], set_={"exported_at": statement.excluded.exported_at}
+        )
+        session.execute(statement, [
+            {"month": month, "changed_at": started, "exported_at": started} for month in months
+        ])
+        session.commit()
+
+    partitions_dir = os.path.join(target, "orders")
+    summary = {
+        "format": file_format,
+        "exported_at": started.isoformat(),
+        "full": full,
+        "written_partitions": months,
+        "partitions": sorted(
+            name.split("=", 1)[1] for name in os.listdir(partitions_dir)
+        ) if os.path.isdir(partitions_dir) else [],
+        "rows": rows,
+    }
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, MANIFEST), "w", encoding="utf-8") as manifest:
+        json.dump(summary, manifest, ensure_ascii=False, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Export orders, items and reference data for analytics")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--full", action="store_true", help="Re-export every month partition")
+    parser.add_argument("--target", default=ANALYTICS_EXPORT_DIR)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        summary = export_analytics(session, args.target, args.format, args.full)
+    print(f"✅ Выгрузка в {args.target}: месяцев записано {len(summary['written_partitions'])}, "
+          f"строк {summary['rows']}")
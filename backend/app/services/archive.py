@@ -0,0 +1,148 @@
+"""
+Hot/cold order archival for CRM Florist System
+Переносит старые завершенные и отмененные заказы (вместе с позициями и
+историей) в архивные таблицы, чтобы рабочая таблица orders оставалась
+маленькой.
+
+Запуск из командной строки:
+    python -m app.services.archive --days 365 --batch-size 500
+"""
+import argparse
+from datetime import datetime, date, timedelta
+from typing import Optional, Sequence
+
+from sqlalchemy import insert, delete, literal, union_all
+from sqlmodel import Session, select, func
+
+from app.core.cache import invalidate
+from app.core.config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from app.models import (
+    Order, OrderItem, OrderHistory, OrderStatus,
+    ArchivedOrder, ArchivedOrderItem, ArchivedOrderHistory
+)
+
+# Статусы, после которых заказ больше не меняется
+ARCHIVABLE_STATUSES = (OrderStatus.DELIVERED, OrderStatus.CANCELED)
+
+def _column_names(model) -> list:
+    return [column.name for column in model.__table__.columns]
+
+
+def _copy_rows(session: Session, live_model, archive_model, condition) -> None:
+    """INSERT ... SELECT строк живой таблицы в архивную"""
+    names = _column_names(live_model)
+    columns = [live_model.__table__.c[name] for name in names]
+    target = list(names)
+
+    if "archived_at" in archive_model.__table__.c:
+        columns.append(literal(datetime.utcnow()).label("archived_at"))
+        target.append("archived_at")
+
+    session.execute(
+        insert(archive_model).from_select(target, select(*columns).where(condition))
+    )
+
+
+def archive_batch(
+    session: Session,
+    cutoff: datetime,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    statuses: Sequence[OrderStatus] = ARCHIVABLE_STATUSES
+) -> int:
+    """
+    Перенести одну пачку заказов с delivery_date < cutoff в архив.
+    Копирование и удаление выполняются в одной транзакции.
+
+    Returns:
+        int: количество перенесенных заказов
+    """
+    order_ids = session.exec(
+        select(Order.id)
+        .where(Order.status.in_(statuses), Order.delivery_date < cutoff)
+        .order_by(Order.id)
+        .limit(batch_size)
+    ).all()
+    if not order_ids:
+        return 0
+
+    _copy_rows(session, Order, ArchivedOrder, Order.id.in_(order_ids))
+    _copy_rows(session, OrderItem, ArchivedOrderItem, OrderItem.order_id.in_(order_ids))
+    _copy_rows(session, OrderHistory, ArchivedOrderHistory, OrderHistory.order_id.in_(order_ids))
+
+    # Удаляем в обратном порядке из-за внешних ключей
+    session.execute(delete(OrderHistory).where(OrderHistory.order_id.in_(order_ids)))
+    session.execute(delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+    session.execute(delete(Order).where(Order.id.in_(order_ids)))
+    invalidate(session, "orders")
+    session.commit()
+
+    return len(order_ids)
+
+
+def archive_orders(
+    session: Session,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    statuses: Sequence[OrderStatus] = ARCHIVABLE_STATUSES
+) -> int:
+    """
+    Архивировать все подходящие заказы пачками по batch_size.
+    Каждая пачка коммитится отдельно, поэтому задачу можно прервать
+    и перезапустить без потери данных.
+
+    Returns:
+        int: общее количество перенесенных заказов
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total = 0
+    while True:
+        moved = archive_batch(session, cutoff, batch_size, statuses)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+def archive_horizon(session: Session) -> Optional[datetime]:
+    """Самая поздняя дата доставки среди архивных заказов"""
+    return session.exec(select(func.max(ArchivedOrder.delivery_date))).one()
+
+
+def range_reaches_archive(session: Session, date_from: Optional[date]) -> bool:
+    """
+    Нужно ли читать архив для диапазона, начинающегося с date_from.
+    Без явной нижней границы архив не читается.
+    """
+    if date_from is None:
+        return False
+    horizon = archive_horizon(session)
+    return horizon is not None and datetime.combine(date_from, datetime.min.time()) <= horizon
+
+
+def orders_source(include_archive: bool):
+    """
+    Источник строк заказов для чтения: таблица orders или
+    UNION ALL живых и архивных заказов с теми же именами колонок.
+    """
+    if not include_archive:
+        return Order.__table__
+
+    names = _column_names(Order)
+    live = select(*[Order.__table__.c[name] for name in names])
+    archived = select(*[ArchivedOrder.__table__.c[name] for name in names])
+    return union_all(live, archived).subquery("all_orders")
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Архивация старых заказов")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="Архивировать заказы с датой доставки старше N дней")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE,
+                        help="Количество заказов в одной транзакции")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        moved = archive_orders(session, older_than_days=args.days, batch_size=args.batch_size)
+    print(f"✅ Перенесено в архив заказов: {moved}")
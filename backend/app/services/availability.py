@@ -0,0 +1,184 @@
+"""
+Product availability engine for CRM Florist System
+Сколько единиц каждого продукта можно собрать из текущих остатков.
+
+Состав каталога (product_inventory) хранится разреженной матрицей
+продукт x материал в формате COO: массивы строк, столбцов и нормы расхода.
+Для каждой ячейки считается floor(остаток / норма), а минимум по строке
+находится одним проходом np.minimum.at для всего каталога.
+
+Изменение остатков (пространство имен "stock") пересчитывает только
+ячейки измененных материалов и строки затронутых продуктов. Изменение
+состава или справочников ("products", "inventory") перестраивает матрицу.
+"""
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlmodel import Session, select
+
+from app.core.cache import subscribe, sync_versions
+from app.models import Product, ProductInventory, Inventory
+
+
+class AvailabilityEngine:
+    """Матрица состава каталога и число собираемых единиц по продуктам"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._matrix_stale = True
+        self._stock_stale = True
+        self.product_ids = np.empty(0, dtype=np.int64)
+        self.product_names: List[str] = []
+        self.material_ids = np.empty(0, dtype=np.int64)
+        self.material_names: List[str] = []
+        self.stock = np.empty(0)
+
+    def load(self, session: Session) -> None:
+        """Построить матрицу состава и рассчитать весь каталог"""
+        with self._lock:
+            self._matrix_stale = False
+            self._stock_stale = False
+            products = session.exec(select(Product.id, Product.name).order_by(Product.id)).all()
+            materials = session.exec(
+                select(Inventory.id, Inventory.name, Inventory.quantity).order_by(Inventory.id)
+            ).all()
+            links = session.exec(
+                select(ProductInventory.product_id, ProductInventory.inventory_id, ProductInventory.quantity_needed)
+                .where(ProductInventory.quantity_needed > 0)
+            ).all()
+
+            self.product_ids = np.array([row[0] for row in products], dtype=np.int64)
+            self.product_names = [row[1] for row in products]
+            self.material_ids = np.array([row[0] for row in materials], dtype=np.int64)
+            self.material_names = [row[1] for row in materials]
+            self.stock = np.array([row[2] or 0 for row in materials], dtype=np.float64)
+
+            link_array = np.array(links, dtype=np.float64).reshape(-1, 3)
+            link_products = link_array[:, 0].astype(np.int64)
+            link_materials = link_array[:, 1].astype(np.int64)
+            # Ссылки на удаленные продукты пропускаются, на удаленные материалы
+            # остаются с нулевым остатком: такой продукт собрать нельзя
+            known = np.isin(link_products, self.product_ids)
+            link_products, link_materials = link_products[known], link_materials[known]
+            need = link_array[known, 2]
+
+            missing = np.setdiff1d(link_materials, self.material_ids)
+            if missing.size:
+                self.material_ids = np.concatenate([self.material_ids, missing])
+                self.material_names += [None] * missing.size
+                self.stock = np.concatenate([self.stock, np.zeros(missing.size)])
+
+            material_order = np.argsort(self.material_ids)
+            rows = np.searchsorted(self.product_ids, link_products)
+            cols = material_order[np.searchsorted(self.material_ids, link_materials, sorter=material_order)]
+
+            # Ячейки упорядочены по продукту: строки матрицы идут подряд
+            by_row = np.lexsort((cols, rows))
+            self.rows, self.cols, self.need = rows[by_row], cols[by_row], need[by_row]
+            self.row_ptr = np.searchsorted(self.rows, np.arange(self.product_ids.size + 1))
+            self.col_order = np.argsort(self.cols, kind="stable")
+            self.col_ptr = np.searchsorted(self.cols[self.col_order], np.arange(self.material_ids.size + 1))
+            self._material_pos = {int(material_id): pos for pos, material_id in enumerate(self.material_ids)}
+
+            self.ratio = self._ratio(np.arange(self.rows.size))
+            self.buildable = np.full(self.product_ids.size, np.inf)
+            np.minimum.at(self.buildable, self.rows, self.ratio)
+
+    def _ratio(self, entries: np.ndarray) -> np.ndarray:
+        stock = np.maximum(self.stock[self.cols[entries]], 0)
+        return np.floor(stock / self.need[entries] + 1e-9)
+
+    def _entries(self, ptr: np.ndarray, positions: np.ndarray, order: Optional[np.ndarray] = None) -> np.ndarray:
+        """Индексы ячеек в строках (или столбцах) positions"""
+        if positions.size == 0:
+            return np.empty(0, dtype=np.int64)
+        entries = np.concatenate([np.arange(ptr[pos], ptr[pos + 1]) for pos in positions])
+        return order[entries] if order is not None else entries
+
+    def update_stock(self, quantities: Dict[int, float]) -> None:
+        """Учесть новые остатки материалов и пересчитать затронутые продукты"""
+        with self._lock:
+            if not self._matrix_stale:
+                self._update_stock(quantities)
+
+    def _update_stock(self, quantities: Dict[int, float]) -> None:
+        positions = []
+        for material_id, quantity in quantities.items():
+            pos = self._material_pos.get(material_id)
+            if pos is not None:
+                self.stock[pos] = quantity or 0
+                positions.append(pos)
+        if not positions:
+            return
+
+        changed = self._entries(self.col_ptr, np.array(positions), self.col_order)
+        self.ratio[changed] = self._ratio(changed)
+
+        affected = np.unique(self.rows[changed])
+        entries = self._entries(self.row_ptr, affected)
+        self.buildable[affected] = np.inf
+        np.minimum.at(self.buildable, self.rows[entries], self.ratio[entries])
+
+    def refresh_stock(self, session: Session) -> None:
+        """Перечитать остатки и пересчитать только изменившиеся материалы"""
+        with self._lock:
+            self._stock_stale = False
+            current = session.exec(select(Inventory.id, Inventory.quantity)).all()
+            changed = {}
+            for material_id, quantity in current:
+                pos = self._material_pos.get(material_id)
+                if pos is not None and self.stock[pos] != (quantity or 0):
+                    changed[material_id] = quantity
+            self._update_stock(changed)
+
+    def ensure_fresh(self, session: Session) -> None:
+        """Перестроить матрицу или остатки, если данные менялись"""
+        sync_versions()
+        if self._matrix_stale:
+            self.load(session)
+        elif self._stock_stale:
+            self.refresh_stock(session)
+
+    def mark_matrix_stale(self) -> None:
+        self._matrix_stale = True
+
+    def mark_stock_stale(self) -> None:
+        self._stock_stale = True
+
+    def limiting_materials(self) -> np.ndarray:
+        """Позиция материала, ограничивающего каждый продукт (-1, если состава нет)"""
+        limiting = np.full(self.product_ids.size, -1, dtype=np.int64)
+        bottleneck = self.ratio == self.buildable[self.rows]
+        rows, first = np.unique(self.rows[bottleneck], return_index=True)
+        limiting[rows] = self.cols[bottleneck][first]
+        return limiting
+
+    def report(self, session: Session, product_ids: Optional[List[int]] = None) -> List[Dict]:
+        """Число собираемых единиц по продуктам; None — продукт без состава"""
+        with self._lock:
+            self.ensure_fresh(session)
+            limiting = self.limiting_materials()
+
+            positions = range(self.product_ids.size)
+            if product_ids is not None:
+                wanted = set(product_ids)
+                positions = [pos for pos in positions if int(self.product_ids[pos]) in wanted]
+
+            report = []
+            for pos in positions:
+                buildable = self.buildable[pos]
+                material = limiting[pos]
+                report.append({
+                    "product_id": int(self.product_ids[pos]),
+                    "name": self.product_names[pos],
+                    "buildable": None if np.isinf(buildable) else int(buildable),
+                    "limiting_inventory_id": int(self.material_ids[material]) if material >= 0 else None,
+                    "limiting_inventory_name": self.material_names[material] if material >= 0 else None,
+                })
+            return report
+
+
+availability = AvailabilityEngine()
+subscribe(("products", "inventory"), availability.mark_matrix_stale)
+subscribe(("stock",), availability.mark_stock_stale)
@@ -0,0 +1,256 @@
+"""
+Streaming bulk client import for CRM Florist System
+Читает CSV или JSONL построчно, проверяет каждую строку правилами
+ClientCreate (нормализация телефона, email, тип клиента) и записывает
+пачками через INSERT ... ON CONFLICT (phone) DO UPDATE. В памяти держится
+только текущая пачка, поэтому размер файла не ограничен.
+
+Запуск из командной строки:
+    python -m app.services.client_import clients.csv [--format jsonl]
+"""
+import argparse
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.core.cache import invalidate
+from app.core.config import IMPORT_BATCH_SIZE, IMPORT_MAX_REPORTED_ERRORS
+from app.db import dialect_insert
+from app.models import Client, ClientType
+from app.schemas import ClientCreate
+from app.services.client_stats import refresh_client_stats
+from app.services.phone_index import phone_index
+
+IMPORT_FIELDS = ("name", "phone", "email", "address", "client_type", "notes")
+
+
+class DuplicatePhonesError(ValueError):
+    """Нет уникального индекса по телефону: в базе остались клиенты с одинаковым телефоном"""
+
+    def __init__(self):
+        super().__init__(
+            "Clients with duplicate phones exist, so the unique phone index is missing. "
+            "Merge them first: POST /api/clients/duplicates/scan, then POST /api/clients/{id}/merge"
+        )
+
+
+def _ensure_unique_phone(session: Session) -> None:
+    """
+    ON CONFLICT (phone) работает только при уникальном индексе по телефону.
+    Если при запуске индекс не создался, пробуем снова: дубликаты могли уже слить.
+    """
+    inspector = inspect(session.get_bind())
+    table = Client.__tablename__
+    unique_columns = [index["column_names"] for index in inspector.get_indexes(table) if index["unique"]]
+    unique_columns += [constraint["column_names"] for constraint in inspector.get_unique_constraints(table)]
+    if ["phone"] in unique_columns:
+        return
+    unique_phone = next(index for index in Client.__table__.indexes if index.name == "uq_clients_phone")
+    try:
+        unique_phone.create(session.connection())
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise DuplicatePhonesError()
+
+
+# Русские заголовки из таблиц магазинов
+HEADER_ALIASES = {
+    "имя": "name",
+    "телефон": "phone",
+    "почта": "email",
+    "адрес": "address",
+    "тип": "client_type",
+    "тип клиента": "client_type",
+    "заметки": "notes",
+    "примечание": "notes",
+}
+
+
+def _normalize_keys(row: Dict) -> Dict:
+    normalized = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip().lower()
+        key = HEADER_ALIASES.get(key, key)
+        if key in IMPORT_FIELDS:
+            if isinstance(value, str):
+                value = value.strip() or None
+            normalized[key] = value
+    return normalized
+
+
+def _iter_csv(stream: TextIO) -> Iterator[Tuple[int, Dict]]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, _normalize_keys(row)
+
+
+def _iter_jsonl(stream: TextIO) -> Iterator[Tuple[int, Dict]]:
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as error:
+            yield line_number, {"__error__": f"Invalid JSON: {error.msg}"}
+            continue
+        if not isinstance(row, dict):
+            yield line_number, {"__error__": "Each line must be a JSON object"}
+            continue
+        yield line_number, _normalize_keys(row)
+
+
+def _validate(row: Dict) -> Tuple[Optional[Dict], Optional[List[str]]]:
+    """Проверить строку правилами ClientCreate; вернуть значения или ошибки"""
+    if "__error__" in row:
+        return None, [row["__error__"]]
+    try:
+        client = ClientCreate(**{key: value for key, value in row.items() if value is not None})
+    except ValidationError as error:
+        return None, [f"{'.'.join(map(str, item['loc']))}: {item['msg']}" for item in error.errors()]
+
+    values = {"phone": client.phone}
+    for field in IMPORT_FIELDS:
+        if field != "phone" and row.get(field) is not None:
+            values[field] = getattr(client, field)
+    return values, None
+
+
+def _upsert_batch(session: Session, rows: Dict[str, Dict]) -> Tuple[int, int]:
+    """
+    Записать пачку (phone -> значения) и вернуть (вставлено, обновлено).
+    При конфликте по телефону обновляются только переданные в файле поля.
+    """
+    phones = list(rows)
+    existing = set(session.exec(select(Client.phone).where(Client.phone.in_(phones))).all())
+    now = datetime.utcnow()
+
+    # Строки с одинаковым набором полей пишутся одним executemany
+    groups: Dict[frozenset, List[Dict]] = {}
+    for values in rows.values():
+        groups.setdefault(frozenset(values), []).append(values)
+
+    for fields, group in groups.items():
+        statement = dialect_insert(session, Client)
+        update_fields = {
+            field: statement.excluded[field] for field in fields if field != "phone"
+        }
+        if update_fields:
+            statement = statement.on_conflict_do_update(index_elements=["phone"], set_=update_fields)
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=["phone"])
+
+        session.execute(statement, [
+            {
+                **{field: None for field in IMPORT_FIELDS},
+                "client_type": ClientType.BOTH,
+                **values,
+                "created_at": now,
+            }
+            for values in group
+        ])
+
+    new_phones = [phone for phone in phones if phone not in existing]
+    if new_phones:
+        created = session.exec(
+            select(Client.id, Client.phone).where(Client.phone.in_(new_phones))
+        ).all()
+        refresh_client_stats(session, [client_id for client_id, _ in created])
+        invalidate(session, "clients")
+    else:
+        created = []
+
+    session.commit()
+    for client_id, phone in created:
+        phone_index.add(client_id, phone)
+
+    return len(new_phones), len(phones) - len(new_phones)
+
+
+def import_clients(
+    session: Session,
+    stream: TextIO,
+    file_format: str = "csv",
+    batch_size: int = IMPORT_BATCH_SIZE
+) -> Dict:
+    """
+    Импортировать клиентов из текстового потока.
+    Каждая пачка коммитится отдельно; ошибочные строки пропускаются
+    и попадают в отчет с номером строки файла.
+    Raises:
+        DuplicatePhonesError: в базе есть дубликаты телефонов (нет уникального индекса)
+    """
+    _ensure_unique_phone(session)
+    rows = _iter_jsonl(stream) if file_format == "jsonl" else _iter_csv(stream)
+
+    report = {"total_rows": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    batch: Dict[str, Dict] = {}
+
+    def flush() -> None:
+        inserted, updated = _upsert_batch(session, batch)
+        report["inserted"] += inserted
+        report["updated"] += updated
+        batch.clear()
+
+    for line_number, row in rows:
+        report["total_rows"] += 1
+        values, errors = _validate(row)
+        if errors:
+            report["failed"] += 1
+            if len(report["errors"]) < IMPORT_MAX_REPORTED_ERRORS:
+                report["errors"].append({"line": line_number, "errors": errors})
+            continue
+
+        # Повтор телефона внутри пачки: побеждает последняя строка
+        batch[values["phone"]] = {**batch.get(values["phone"], {}), **values}
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    report["errors_truncated"] = report["failed"] > len(report["errors"])
+    return report
+
+
+def detect_format(filename: Optional[str], file_format: Optional[str] = None) -> str:
+    """Определить формат по явному параметру или расширению файла"""
+    if file_format:
+        return file_format.lower()
+    if filename and filename.lower().endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+
+def text_stream(binary: io.IOBase) -> TextIO:
+    """Текстовый поток поверх бинарного файла (BOM из Excel пропускается)"""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Импорт клиентов из CSV/JSONL")
+    parser.add_argument("path", help="Путь к файлу CSV или JSONL")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with open(args.path, "rb") as binary, Session(engine) as session:
+        result = import_clients(
+            session,
+            text_stream(binary),
+            detect_format(args.path, args.format),
+            args.batch_size
+        )
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,104 @@
+"""
+Client aggregates maintenance for CRM Florist System
+Таблица client_stats хранит по строке на каждого клиента: число заказов,
+сумму покупок и дату последнего заказа (как заказчика, без отмененных).
+Архивные заказы учитываются наравне с живыми.
+
+Строки пересчитываются для затронутых клиентов в той же транзакции,
+что и запись заказа. Полная перестройка:
+    python -m app.services.client_stats
+"""
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import insert, delete, literal, union_all
+from sqlmodel import Session, select, func
+
+from app.models import Client, ClientStats, Order, OrderStatus, ArchivedOrder
+
+
+def _stats_select(client_ids: Optional[list] = None):
+    """SELECT строк client_stats: все клиенты, LEFT JOIN агрегатов заказов"""
+    branches = []
+    for model in (Order, ArchivedOrder):
+        branch = (
+            select(model.client_id, model.total_price, model.created_at)
+            .where(model.status != OrderStatus.CANCELED)
+        )
+        if client_ids is not None:
+            branch = branch.where(model.client_id.in_(client_ids))
+        branches.append(branch)
+    orders = union_all(*branches).subquery("customer_orders")
+
+    totals = (
+        select(
+            orders.c.client_id.label("client_id"),
+            func.count().label("orders_count"),
+            func.sum(func.coalesce(orders.c.total_price, 0)).label("lifetime_value"),
+            func.max(orders.c.created_at).label("last_order_at"),
+        )
+        .group_by(orders.c.client_id)
+        .subquery("totals")
+    )
+
+    query = (
+        select(
+            Client.id,
+            func.coalesce(totals.c.orders_count, 0),
+            func.coalesce(totals.c.lifetime_value, 0),
+            totals.c.last_order_at,
+            literal(datetime.utcnow()),
+        )
+        .select_from(Client)
+        .outerjoin(totals, totals.c.client_id == Client.id)
+    )
+    if client_ids is not None:
+        query = query.where(Client.id.in_(client_ids))
+    return query
+
+
+_COLUMNS = ["client_id", "orders_count", "lifetime_value", "last_order_at", "updated_at"]
+
+
+def refresh_client_stats(session: Session, client_ids: Iterable[int]) -> None:
+    """
+    Пересчитать агрегаты для указанных клиентов.
+    Не коммитит — вызывается внутри транзакции, изменившей заказы.
+    """
+    client_ids = sorted({client_id for client_id in client_ids if client_id})
+    if not client_ids:
+        return
+
+    session.flush()
+    session.execute(delete(ClientStats).where(ClientStats.client_id.in_(client_ids)))
+    session.execute(insert(ClientStats).from_select(_COLUMNS, _stats_select(client_ids)))
+
+
+def remove_client_stats(session: Session, client_id: int) -> None:
+    """Удалить строку агрегатов перед удалением клиента"""
+    session.execute(delete(ClientStats).where(ClientStats.client_id == client_id))
+
+
+def rebuild_client_stats(session: Session) -> int:
+    """Полностью перестроить client_stats одним INSERT ... SELECT"""
+    session.execute(delete(ClientStats))
+    session.execute(insert(ClientStats).from_select(_COLUMNS, _stats_select()))
+    session.commit()
+    return session.exec(select(func.count()).select_from(ClientStats)).one()
+
+
+def ensure_client_stats(session: Session) -> None:
+    """Заполнить client_stats, если таблица пуста, а клиенты уже есть"""
+    has_stats = session.exec(select(ClientStats.client_id).limit(1)).first()
+    has_clients = session.exec(select(Client.id).limit(1)).first()
+    if has_clients and not has_stats:
+        rebuild_client_stats(session)
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        rows = rebuild_client_stats(session)
+    print(f"✅ Агрегаты клиентов перестроены: {rows}")
@@ -0,0 +1,196 @@
+"""
+Client cohort analytics for CRM Florist System
+Месячные когорты (месяц первого заказа -> доля клиентов, заказавших снова
+через N месяцев), интервалы между покупками и интервалы перед праздниками.
+
+Заказы (живые и архивные, без отмененных) читаются потоком, упорядоченные
+по (client_id, created_at), пачками по COHORT_CHUNK_SIZE строк в массивы
+NumPy. Граница пачки всегда проходит между клиентами: строки последнего
+клиента переносятся в следующую пачку. Все расчеты по пачке векторные, а
+между пачками сохраняются только счетчики фиксированного размера (матрица
+когорт, гистограммы по дням), поэтому память не растет с числом заказов.
+
+Запуск из командной строки:
+    python -m app.services.cohorts
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from sqlalchemy import union_all
+from sqlmodel import Session, select, func
+
+from app.core.config import COHORT_CHUNK_SIZE, HOLIDAYS, HOLIDAY_WINDOW_DAYS
+from app.core.timebuckets import SHOP_TZ
+from app.models import ArchivedOrder, Order, OrderStatus
+
+# Интервалы до года считаются по дням, длиннее — в последней корзине
+MAX_GAP_DAYS = 365
+GAP_RANGES = [(0, 7), (7, 14), (14, 30), (30, 60), (60, 90), (90, 180), (180, 365), (365, None)]
+
+Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _orders_query():
+    branches = [
+        select(model.client_id, model.created_at, func.coalesce(model.total_price, 0))
+        .where(model.status != OrderStatus.CANCELED)
+        for model in (Order, ArchivedOrder)
+    ]
+    orders = union_all(*branches).subquery("cohort_orders")
+    return select(orders.c[0], orders.c[1], orders.c[2]).order_by(orders.c[0], orders.c[1])
+
+
+def _to_arrays(rows) -> Chunk:
+    clients = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    created = np.array([row[1] for row in rows], dtype="datetime64[s]")
+    totals = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=len(rows))
+    return clients, created, totals
+
+
+def stream_orders(session: Session, chunk_size: int = COHORT_CHUNK_SIZE) -> Iterator[Chunk]:
+    """Пачки (client_id, created_at, total_price), не разрывающие заказы одного клиента"""
+    result = session.execute(_orders_query().execution_options(yield_per=chunk_size))
+    carry = None
+    for rows in result.partitions(chunk_size):
+        chunk = _to_arrays(rows)
+        if carry is not None:
+            chunk = tuple(np.concatenate(pair) for pair in zip(carry, chunk))
+        clients = chunk[0]
+        cut = np.searchsorted(clients, clients[-1])
+        carry = tuple(array[cut:] for array in chunk)
+        if cut:
+            yield tuple(array[:cut] for array in chunk)
+    if carry is not None and carry[0].size:
+        yield carry
+
+
+def _month_span(session: Session) -> Tuple[int, int]:
+    """Номера первого и последнего месяца заказов (месяцы с 1970 года)"""
+    bounds = [
+        session.exec(select(func.min(model.created_at), func.max(model.created_at))).one()
+        for model in (Order, ArchivedOrder)
+    ]
+    lows = [low for low, _ in bounds if low is not None]
+    highs = [high for _, high in bounds if high is not None]
+    if not lows:
+        return 0, 0
+    months = _months(np.array([min(lows), max(highs)], dtype="datetime64[s]"))
+    return int(months[0]), int(months[1])
+
+
+def _shop_offset() -> np.timedelta64:
+    # Текущее смещение магазина: историческая смена пояса сдвигает
+    # границы месяцев не больше чем на час
+    offset = datetime.now(timezone.utc).astimezone(SHOP_TZ).utcoffset()
+    return np.timedelta64(int(offset.total_seconds()), "s")
+
+
+def _months(created: np.ndarray) -> np.ndarray:
+    return (created + _shop_offset()).astype("datetime64[M]").astype(np.int64)
+
+
+def _days_to_holiday(created: np.ndarray, month_day: str) -> np.ndarray:
+    """Дней от заказа до ближайшего следующего праздника month_day ('MM-DD')"""
+    month, day = (int(part) for part in month_day.split("-"))
+    local_days = (created + _shop_offset()).astype("datetime64[D]")
+    years = local_days.astype("datetime64[Y]")
+    holiday = (years.astype("datetime64[M]") + (month - 1)).astype("datetime64[D]") + (day - 1)
+    passed = holiday < local_days
+    holiday[passed] = ((years[passed] + 1).astype("datetime64[M]") + (month - 1)).astype("datetime64[D]") + (day - 1)
+    return (holiday - local_days).astype(np.int64)
+
+
+def _gap_summary(histogram: np.ndarray) -> Dict:
+    """Среднее (по дням, до года), медиана и корзины по дневной гистограмме интервалов"""
+    total = int(histogram.sum())
+    if not total:
+        return {"count": 0, "median_days": None, "ranges": []}
+    median = int(np.searchsorted(np.cumsum(histogram), (total + 1) / 2))
+    ranges = []
+    for low, high in GAP_RANGES:
+        count = int(histogram[low:high].sum() if high else histogram[low:].sum())
+        ranges.append({"from_days": low, "to_days": high, "count": count, "share": round(count / total, 4)})
+    return {"count": total, "median_days": median, "ranges": ranges}
+
+
+def cohort_report(session: Session, chunk_size: int = COHORT_CHUNK_SIZE) -> Dict:
+    """Когорты, интервалы между покупками и интервалы перед праздниками"""
+    first_month, last_month = _month_span(session)
+    size = last_month - first_month + 1
+    active = np.zeros((size, size), dtype=np.int64)  # когорта x смещение: активные клиенты
+    revenue = np.zeros(size)
+    gaps = np.zeros(MAX_GAP_DAYS + 1, dtype=np.int64)
+    holiday_orders = {holiday: np.zeros(2, dtype=np.int64) for holiday in HOLIDAYS}  # заказы, повторные
+    holiday_gaps = {holiday: np.zeros(MAX_GAP_DAYS + 1, dtype=np.int64) for holiday in HOLIDAYS}
+    orders_count = clients_count = repeat_clients = 0
+
+    for clients, created, totals in stream_orders(session, chunk_size):
+        months = _months(created) - first_month
+        is_first = np.r_[True, clients[1:] != clients[:-1]]
+        starts = np.flatnonzero(is_first)
+        # Индекс первого заказа клиента для каждой строки
+        first_row = np.maximum.accumulate(np.where(is_first, np.arange(clients.size), 0))
+        cohort = months[first_row]
+        offset = months - cohort
+
+        # Клиент учитывается в (когорта, смещение) один раз: смещение не убывает внутри клиента
+        distinct = is_first | np.r_[True, offset[1:] != offset[:-1]]
+        np.add.at(active, (cohort[distinct], offset[distinct]), 1)
+        np.add.at(revenue, cohort, totals)
+
+        # Интервал до предыдущего заказа того же клиента (для первых заказов его нет)
+        gap_days = np.r_[0, np.diff(created).astype("timedelta64[D]").astype(np.int64)]
+        repeat = ~is_first
+        gaps += np.bincount(np.minimum(gap_days[repeat], MAX_GAP_DAYS), minlength=MAX_GAP_DAYS + 1)
+
+        for holiday in HOLIDAYS:
+            before_holiday = _days_to_holiday(created, holiday) <= HOLIDAY_WINDOW_DAYS
+            holiday_orders[holiday] += [before_holiday.sum(), (before_holiday & repeat).sum()]
+            holiday_gaps[holiday] += np.bincount(
+                np.minimum(gap_days[before_holiday & repeat], MAX_GAP_DAYS), minlength=MAX_GAP_DAYS + 1
+            )
+
+        orders_count += clients.size
+        clients_count += starts.size
+        repeat_clients += int((np.diff(np.r_[starts, clients.size]) > 1).sum())
+
+    cohorts: List[Dict] = []
+    for index in np.flatnonzero(active[:, 0]):
+        cohort_size = int(active[index, 0])
+        horizon = size - index
+        cohorts.append({
+            "cohort": str(np.datetime64(first_month + int(index), "M")),
+            "clients": cohort_size,
+            "revenue": round(float(revenue[index]), 2),
+            "retention": [round(int(count) / cohort_size, 4) for count in active[index, :horizon]],
+        })
+
+    return {
+        "generated_at": datetime.utcnow(),
+        "orders": orders_count,
+        "clients": clients_count,
+        "repeat_rate": round(repeat_clients / clients_count, 4) if clients_count else 0.0,
+        "cohorts": cohorts,
+        "purchase_gaps": _gap_summary(gaps),
+        "holidays": [
+            {
+                "holiday": holiday,
+                "window_days": HOLIDAY_WINDOW_DAYS,
+                "orders": int(holiday_orders[holiday][0]),
+                "repeat_orders": int(holiday_orders[holiday][1]),
+                "gaps": _gap_summary(holiday_gaps[holiday]),
+            }
+            for holiday in HOLIDAYS
+        ],
+    }
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        report = cohort_report(session)
+    print(f"✅ Когорты: {len(report['cohorts'])}, заказов: {report['orders']}, "
+          f"клиентов: {report['clients']}, повторных: {report['repeat_rate']:.1%}")
@@ -0,0 +1,233 @@
+"""
+Duplicate client detection and merge for CRM Florist System
+
+Поиск: один проход по таблице клиентов, каждый клиент попадает в блоки по
+ключам (последние 7 цифр телефона, начало телефона, email, нормализованное
+имя). Попарно сравниваются только клиенты внутри одного блока, поэтому
+работа растет почти линейно, а не квадратично от числа клиентов.
+
+Слияние: заказы (живые и архивные) переназначаются на основного клиента
+UPDATE-ами по множеству id, пустые поля основного клиента заполняются
+из дубликатов, дубликаты удаляются.
+
+Запуск из командной строки:
+    python -m app.services.dedup [--min-score 0.75]
+"""
+import argparse
+import re
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import delete, insert, update
+from sqlmodel import Session, select
+
+from app.core.cache import invalidate
+from app.core.config import DEDUP_MAX_BLOCK_SIZE, DEDUP_MIN_SCORE
+from app.models import (
+    Client, ClientStats, ClientType, DuplicateCandidate, Order, ArchivedOrder
+)
+from app.services.analytics_export import mark_changed
+from app.services.client_stats import refresh_client_stats
+from app.services.phone_index import phone_index
+
+# Веса признаков в итоговой оценке
+WEIGHTS = {"phone": 0.5, "email": 0.3, "name": 0.2}
+
+STREAM_CHUNK = 10000
+
+
+class _Record(NamedTuple):
+    phone: str
+    email: Optional[str]
+    name: Optional[str]
+
+
+def _phone_digits(phone: Optional[str]) -> str:
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:]
+
+
+def _email_key(email: Optional[str]) -> Optional[str]:
+    if not email or "@" not in email:
+        return None
+    local, domain = email.strip().lower().rsplit("@", 1)
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+
+def _name_key(name: Optional[str]) -> Optional[str]:
+    if not name:
+        return None
+    words = re.findall(r"\w+", name.lower().replace("ё", "е"))
+    return " ".join(sorted(words)) or None
+
+
+def _blocking_keys(record: _Record) -> List[str]:
+    keys = []
+    if len(record.phone) >= 7:
+        keys.append(f"p7:{record.phone[-7:]}")
+        keys.append(f"p8:{record.phone[:8]}")
+    if record.email:
+        keys.append(f"e:{record.email}")
+    if record.name:
+        keys.append(f"n:{record.name}")
+    return keys
+
+
+def _phone_similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    if len(a) == len(b) and sum(x != y for x, y in zip(a, b)) == 1:
+        return 0.8  # опечатка в одной цифре
+    if a[-7:] == b[-7:]:
+        return 0.6  # другой код оператора
+    return 0.0
+
+
+def score_pair(a: _Record, b: _Record, min_score: float = 0.0) -> Tuple[float, List[str]]:
+    """
+    Оценка сходства двух клиентов от 0 до 1 и совпавшие признаки.
+    Если даже при полном совпадении имен оценка не достигнет min_score,
+    дорогое сравнение имен пропускается и возвращается 0.
+    """
+    similarities = {"phone": _phone_similarity(a.phone, b.phone)}
+    if a.email and b.email:
+        similarities["email"] = 1.0 if a.email == b.email else 0.0
+    if a.name and b.name:
+        similarities["name"] = 1.0
+        best = sum(WEIGHTS[feature] * value for feature, value in similarities.items())
+        if best / sum(WEIGHTS[feature] for feature in similarities) < min_score:
+            return 0.0, []
+        similarities["name"] = SequenceMatcher(None, a.name, b.name).ratio()
+
+    total_weight = sum(WEIGHTS[feature] for feature in similarities)
+    score = sum(WEIGHTS[feature] * value for feature, value in similarities.items()) / total_weight
+    reasons = [feature for feature, value in similarities.items() if value >= 0.6]
+    return round(score, 4), reasons
+
+
+def find_duplicates(session: Session, min_score: float = DEDUP_MIN_SCORE) -> List[Dict]:
+    """
+    Найти пары похожих клиентов за один проход по таблице.
+    Возвращает пары, отсортированные по убыванию оценки.
+    """
+    records: Dict[int, _Record] = {}
+    blocks: Dict[str, List[int]] = {}
+
+    rows = session.execute(
+        select(Client.id, Client.phone, Client.email, Client.name)
+        .execution_options(yield_per=STREAM_CHUNK)
+    )
+    for client_id, phone, email, name in rows:
+        record = _Record(_phone_digits(phone), _email_key(email), _name_key(name))
+        records[client_id] = record
+        for key in _blocking_keys(record):
+            blocks.setdefault(key, []).append(client_id)
+
+    candidate_pairs: Set[Tuple[int, int]] = set()
+    for members in blocks.values():
+        if 1 < len(members) <= DEDUP_MAX_BLOCK_SIZE:
+            candidate_pairs.update(combinations(sorted(members), 2))
+    blocks.clear()
+
+    duplicates = []
+    for client_id, duplicate_id in candidate_pairs:
+        score, reasons = score_pair(records[client_id], records[duplicate_id], min_score)
+        if score >= min_score:
+            duplicates.append({
+                "client_id": client_id,
+                "duplicate_id": duplicate_id,
+                "score": score,
+                "reasons": reasons,
+            })
+
+    duplicates.sort(key=lambda pair: (-pair["score"], pair["client_id"], pair["duplicate_id"]))
+    return duplicates
+
+
+def store_duplicates(session: Session, duplicates: List[Dict]) -> int:
+    """Заменить сохраненные кандидаты результатом нового поиска"""
+    session.execute(delete(DuplicateCandidate))
+    if duplicates:
+        session.execute(insert(DuplicateCandidate), [
+            {**pair, "reasons": ",".join(pair["reasons"])} for pair in duplicates
+        ])
+    session.commit()
+    return len(duplicates)
+
+
+def merge_clients(session: Session, target_id: int, source_ids: List[int]) -> Client:
+    """
+    Слить клиентов source_ids в target_id.
+    Заказы переназначаются множественными UPDATE, всё в одной транзакции.
+    Raises:
+        ValueError: если клиенты не найдены или target входит в source_ids
+    """
+    source_ids = sorted(set(source_ids))
+    if target_id in source_ids:
+        raise ValueError("Target client cannot be merged into itself")
+
+    target = session.get(Client, target_id)
+    if not target:
+        raise ValueError("Target client not found")
+    sources = session.exec(select(Client).where(Client.id.in_(source_ids))).all()
+    if len(sources) != len(source_ids):
+        raise ValueError("Some source clients not found")
+
+    # Месяцы выгрузки для аналитики, в которых у заказов сменится клиент
+    mark_changed(session, [
+        delivery_date
+        for model in (Order, ArchivedOrder)
+        for delivery_date in session.exec(
+            select(model.delivery_date)
+            .where(model.client_id.in_(source_ids) | model.recipient_id.in_(source_ids))
+        ).all()
+    ])
+    for model in (Order, ArchivedOrder):
+        session.execute(
+            update(model).where(model.client_id.in_(source_ids)).values(client_id=target_id)
+        )
+        session.execute(
+            update(model).where(model.recipient_id.in_(source_ids)).values(recipient_id=target_id)
+        )
+
+    # Пустые поля основного клиента берем из дубликатов
+    for source in sources:
+        for field in ("name", "email", "address", "notes"):
+            if not getattr(target, field) and getattr(source, field):
+                setattr(target, field, getattr(source, field))
+        if source.client_type != target.client_type:
+            target.client_type = ClientType.BOTH
+
+    session.execute(delete(DuplicateCandidate).where(
+        DuplicateCandidate.client_id.in_(source_ids) | DuplicateCandidate.duplicate_id.in_(source_ids)
+    ))
+    session.execute(delete(ClientStats).where(ClientStats.client_id.in_(source_ids)))
+    source_phones = [(source.id, source.phone) for source in sources]
+    for source in sources:
+        session.delete(source)
+
+    session.add(target)
+    refresh_client_stats(session, [target_id])
+    invalidate(session, "clients", "orders")
+    session.commit()
+    session.refresh(target)
+
+    for client_id, phone in source_phones:
+        phone_index.remove(client_id, phone)
+    return target
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Поиск дубликатов клиентов")
+    parser.add_argument("--min-score", type=float, default=DEDUP_MIN_SCORE)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        found = store_duplicates(session, find_duplicates(session, args.min_score))
+    print(f"✅ Найдено пар-кандидатов в дубликаты: {found}")
@@ -0,0 +1,170 @@
+"""
+Inventory audit (stocktake) for CRM Florist System
+Подсчеты принимаются пачкой и сохраняются вместе с ожидаемым остатком на
+момент подсчета, поэтому движения между подсчетом и завершением не
+искажают расхождение. Расхождения по всем позициям считаются одним
+запросом (склад LEFT JOIN подсчеты). Завершение проводит все корректировки
+одним UPDATE и одной пачкой записей в журнале.
+"""
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlmodel import Session, select
+
+from app.db import dialect_insert
+from app.models import Inventory, InventoryAudit, InventoryAuditItem, InventoryTransactionType
+from app.services.stock_ledger import apply_set_deltas
+
+IN_PROGRESS = "in_progress"
+COMPLETED = "completed"
+
+
+def current_audit(session: Session) -> Optional[InventoryAudit]:
+    return session.exec(
+        select(InventoryAudit).where(InventoryAudit.status == IN_PROGRESS).order_by(InventoryAudit.id.desc())
+    ).first()
+
+
+def start_audit(session: Session) -> InventoryAudit:
+    """
+    Начать инвентаризацию.
+    Raises:
+        ValueError: если уже есть незавершенная
+    """
+    if current_audit(session):
+        raise ValueError("Audit already in progress")
+    audit = InventoryAudit()
+    session.add(audit)
+    session.commit()
+    session.refresh(audit)
+    return audit
+
+
+def save_counts(session: Session, audit: InventoryAudit, counts: Dict[int, float]) -> int:
+    """
+    Сохранить подсчеты {inventory_id: количество} одним INSERT ... ON CONFLICT.
+    Повторный подсчет позиции заменяет предыдущий.
+    Raises:
+        ValueError: инвентаризация завершена или позиции не найдены
+    """
+    if audit.status != IN_PROGRESS:
+        raise ValueError("Audit is already completed")
+    if not counts:
+        return 0
+
+    expected = dict(session.exec(
+        select(Inventory.id, Inventory.quantity).where(Inventory.id.in_(list(counts)))
+    ).all())
+    missing = sorted(set(counts) - set(expected))
+    if missing:
+        raise ValueError(f"Inventory items not found: {missing}")
+
+    now = datetime.utcnow()
+    statement = dialect_insert(session, InventoryAuditItem)
+    statement = statement.on_conflict_do_update(
+        index_elements=["audit_id", "inventory_id"],
+        set_={
+            "expected_quantity": statement.excluded.expected_quantity,
+            "actual_quantity": statement.excluded.actual_quantity,
+            "counted_at": statement.excluded.counted_at,
+        }
+    )
+    session.execute(statement, [
+        {
+            "audit_id": audit.id,
+            "inventory_id": inventory_id,
+            "expected_quantity": expected[inventory_id],
+            "actual_quantity": actual,
+            "counted_at": now,
+        }
+        for inventory_id, actual in counts.items()
+    ])
+    session.commit()
+    return len(counts)
+
+
+def audit_view(session: Session, audit: InventoryAudit) -> Dict:
+    """Инвентаризация со всеми позициями склада и расхождениями (один запрос)"""
+    counted = (
+        select(InventoryAuditItem)
+        .where(InventoryAuditItem.audit_id == audit.id)
+        .subquery("counted")
+    )
+    rows = session.exec(
+        select(
+            Inventory.id, Inventory.name, Inventory.unit, Inventory.quantity,
+            counted.c.expected_quantity, counted.c.actual_quantity,
+            counted.c.actual_quantity - counted.c.expected_quantity,
+        )
+        .outerjoin(counted, counted.c.inventory_id == Inventory.id)
+        .order_by(Inventory.name)
+    ).all()
+
+    items = [
+        {
+            "inventory_id": inventory_id,
+            "name": name,
+            "category": None,
+            "unit": unit,
+            "system_quantity": expected if expected is not None else quantity,
+            "actual_quantity": actual,
+            "difference": difference,
+        }
+        for inventory_id, name, unit, quantity, expected, actual, difference in rows
+    ]
+    counted_items = [item for item in items if item["actual_quantity"] is not None]
+    return {
+        "id": audit.id,
+        "status": audit.status,
+        "started_at": audit.started_at,
+        "completed_at": audit.completed_at,
+        "items": items,
+        "summary": {
+            "total_items": len(items),
+            "counted_items": len(counted_items),
+            "discrepancies": sum(1 for item in counted_items if item["difference"]),
+        },
+    }
+
+
+def complete_audit(session: Session, audit: InventoryAudit) -> Dict:
+    """
+    Провести расхождения корректировками и закрыть инвентаризацию.
+    Все корректировки — один UPDATE и одна пачка в журнале, в одной транзакции.
+    Raises:
+        ValueError: если инвентаризация уже завершена
+    """
+    if audit.status != IN_PROGRESS:
+        raise ValueError("Audit is already completed")
+
+    variances = (
+        select(
+            InventoryAuditItem.inventory_id.label("inventory_id"),
+            (InventoryAuditItem.actual_quantity - InventoryAuditItem.expected_quantity).label("delta"),
+        )
+        .where(InventoryAuditItem.audit_id == audit.id)
+        .subquery("variances")
+    )
+    transactions = apply_set_deltas(
+        session, variances, InventoryTransactionType.AUDIT,
+        f"Инвентаризация #{audit.id}", "audit", audit.id,
+        check_stock=False
+    )
+
+    adjustments = [
+        {"inventory_id": transaction.inventory_id, "difference": transaction.quantity}
+        for transaction in transactions
+    ]
+    audit.status = COMPLETED
+    audit.completed_at = datetime.utcnow()
+    session.add(audit)
+    session.commit()
+    session.refresh(audit)
+
+    return {
+        "id": audit.id,
+        "status": audit.status,
+        "completed_at": audit.completed_at,
+        "adjusted_items": len(adjustments),
+        "adjustments": adjustments,
+    }
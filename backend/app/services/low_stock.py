@@ -0,0 +1,92 @@
+"""
+Low stock tracking for CRM Florist System
+Множество позиций с остатком не выше минимального хранится в таблице
+low_stock_items и обновляется при каждом движении по складу только для
+затронутых позиций. Каждый переход через порог записывается в
+low_stock_events; поток оповещений читает новые события оттуда, поэтому
+его видят все воркеры.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+
+from app.models import Inventory, LowStockItem, LowStockEvent
+
+
+def track_low_stock(session: Session, inventory_ids: Optional[Iterable[int]] = None) -> List[LowStockEvent]:
+    """
+    Сверить множество низких остатков для позиций (или всего склада)
+    и записать переходы через порог. Не коммитит.
+    """
+    session.flush()
+    items_query = select(Inventory.id, Inventory.quantity, Inventory.min_quantity)
+    flagged_query = select(LowStockItem.inventory_id)
+    if inventory_ids is not None:
+        inventory_ids = list(inventory_ids)
+        if not inventory_ids:
+            return []
+        items_query = items_query.where(Inventory.id.in_(inventory_ids))
+        flagged_query = flagged_query.where(LowStockItem.inventory_id.in_(inventory_ids))
+
+    flagged = set(session.exec(flagged_query).all())
+    now = datetime.utcnow()
+    events = []
+    for inventory_id, quantity, min_quantity in session.exec(items_query).all():
+        is_low = min_quantity is not None and quantity <= min_quantity
+        if is_low == (inventory_id in flagged):
+            continue
+        events.append(LowStockEvent(
+            inventory_id=inventory_id,
+            event="low" if is_low else "recovered",
+            quantity=quantity,
+            min_quantity=min_quantity,
+            created_at=now,
+        ))
+
+    if not events:
+        return []
+
+    became_low = [event.inventory_id for event in events if event.event == "low"]
+    recovered = [event.inventory_id for event in events if event.event == "recovered"]
+    if became_low:
+        session.execute(insert(LowStockItem), [
+            {"inventory_id": inventory_id, "since": now} for inventory_id in became_low
+        ])
+    if recovered:
+        session.execute(delete(LowStockItem).where(LowStockItem.inventory_id.in_(recovered)))
+    session.add_all(events)
+    session.flush()
+    return events
+
+
+def forget_item(session: Session, inventory_id: int) -> None:
+    """Убрать позицию из множества перед ее удалением"""
+    session.execute(delete(LowStockItem).where(LowStockItem.inventory_id == inventory_id))
+
+
+def low_stock_items(session: Session) -> List[Dict]:
+    """Текущие позиции с низким остатком — чтение готового множества"""
+    rows = session.exec(
+        select(Inventory, LowStockItem.since)
+        .join(LowStockItem, LowStockItem.inventory_id == Inventory.id)
+        .order_by(LowStockItem.since)
+    ).all()
+    return [{**item.model_dump(), "low_since": since} for item, since in rows]
+
+
+def events_after(session: Session, after_id: int = 0, limit: int = 100) -> List[Dict]:
+    """События после after_id в порядке появления"""
+    rows = session.exec(
+        select(LowStockEvent, Inventory.name)
+        .outerjoin(Inventory, Inventory.id == LowStockEvent.inventory_id)
+        .where(LowStockEvent.id > after_id)
+        .order_by(LowStockEvent.id)
+        .limit(limit)
+    ).all()
+    return [{**event.model_dump(), "name": name} for event, name in rows]
+
+
+def last_event_id(session: Session) -> int:
+    return session.exec(select(LowStockEvent.id).order_by(LowStockEvent.id.desc()).limit(1)).first() or 0
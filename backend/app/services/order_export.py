@@ -0,0 +1,114 @@
+"""
+Streaming CSV export of orders for CRM Florist System
+Одна строка CSV на позицию заказа (заказ без позиций — одна строка с
+пустыми полями позиции) с данными заказчика и получателя.
+
+Строки читаются серверным курсором пачками по EXPORT_BATCH_SIZE (yield_per)
+и сразу отдаются клиенту, поэтому память не зависит от диапазона дат.
+Заголовок отдается до первого запроса к БД. Время — по часовому поясу магазина.
+"""
+import csv
+import io
+from datetime import date
+from typing import Iterator, Optional
+
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select
+
+from app.core.config import EXPORT_BATCH_SIZE
+from app.core.timebuckets import local_range, to_local
+from app.db import engine
+from app.models import (
+    ArchivedOrder, ArchivedOrderItem, Client, Order, OrderItem, OrderStatus, Product
+)
+from app.services import archive
+
+COLUMNS = [
+    "order_id", "created_at", "delivery_date", "delivery_time_range", "status",
+    "client_name", "client_phone", "recipient_name", "recipient_phone",
+    "delivery_address", "order_total",
+    "item_id", "product_id", "product_name", "quantity", "price", "line_total",
+]
+
+
+def _rows_query(order_model, item_model, date_from, date_to, status):
+    customer = aliased(Client, name="customer")
+    recipient = aliased(Client, name="recipient")
+    query = (
+        select(
+            order_model.id, order_model.created_at, order_model.delivery_date,
+            order_model.delivery_time_range, order_model.status,
+            customer.name, customer.phone, recipient.name, recipient.phone,
+            order_model.delivery_address, order_model.total_price,
+            item_model.id, item_model.product_id, Product.name, item_model.quantity, item_model.price,
+        )
+        .select_from(order_model)
+        .outerjoin(customer, customer.id == order_model.client_id)
+        .outerjoin(recipient, recipient.id == order_model.recipient_id)
+        .outerjoin(item_model, item_model.order_id == order_model.id)
+        .outerjoin(Product, Product.id == item_model.product_id)
+        .where(*local_range(order_model.delivery_date, date_from, date_to))
+        .order_by(order_model.delivery_date, order_model.id, item_model.id)
+    )
+    if status:
+        query = query.where(order_model.status == status)
+    return query
+
+
+def _format(row) -> list:
+    (order_id, created_at, delivery_date, time_range, status,
+     client_name, client_phone, recipient_name, recipient_phone,
+     address, total, item_id, product_id, product_name, quantity, price) = row
+    return [
+        order_id,
+        to_local(created_at).isoformat(sep=" ", timespec="seconds") if created_at else "",
+        to_local(delivery_date).isoformat(sep=" ", timespec="minutes") if delivery_date else "",
+        time_range or "",
+        status.value if isinstance(status, OrderStatus) else status,
+        client_name or "", client_phone or "", recipient_name or "", recipient_phone or "",
+        address or "", total if total is not None else "",
+        item_id if item_id is not None else "", product_id if product_id is not None else "",
+        product_name or "", quantity if quantity is not None else "", price if price is not None else "",
+        quantity * price if quantity is not None and price is not None else "",
+    ]
+
+
+def export_orders_csv(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    status: Optional[OrderStatus] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[str]:
+    """
+    Генератор CSV-текста пачками. Открывает собственную сессию: ответ
+    отдается уже после выхода из обработчика запроса.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    # BOM — чтобы Excel открыл кириллицу без выбора кодировки
+    writer.writerow(COLUMNS)
+    yield "\ufeff" + flush()
+
+    with Session(engine) as session:
+        sources = [(Order, OrderItem)]
+        # Выгрузка без нижней границы — для бухгалтерии это все заказы, включая архив
+        reaches_archive = (
+            archive.archive_horizon(session) is not None if date_from is None
+            else archive.range_reaches_archive(session, date_from)
+        )
+        if reaches_archive:
+            sources.insert(0, (ArchivedOrder, ArchivedOrderItem))
+
+        for order_model, item_model in sources:
+            query = _rows_query(order_model, item_model, date_from, date_to, status)
+            result = session.execute(query.execution_options(yield_per=batch_size))
+            for rows in result.partitions():
+                writer.writerows(_format(row) for row in rows)
+                yield flush()
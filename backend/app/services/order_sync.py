@@ -0,0 +1,85 @@
+"""
+Order write hooks for CRM Florist System
+Единая точка обновления производных данных при изменении заказа.
+Вызывается роутерами заказов до commit, чтобы агрегаты и складские
+списания менялись в той же транзакции, что и сам заказ.
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlmodel import Session
+
+from app.core.cache import invalidate
+from app.models import Order, OrderStatus
+from app.services.analytics_export import mark_changed
+from app.services.client_stats import refresh_client_stats
+from app.services.reservations import refresh_reservations, release_reservations
+from app.services.sales_rollup import order_day, refresh_daily_sales
+from app.services.stock_ledger import consume_for_order, release_for_order
+from app.services.workload import balancer
+
+
+class OrderSnapshot(NamedTuple):
+    """Поля заказа, от которых зависят агрегаты"""
+    order_id: int
+    client_id: int
+    status: OrderStatus
+    delivery_date: datetime
+    total_price: float
+    executor_id: Optional[int]
+
+
+def snapshot(order: Optional[Order]) -> Optional[OrderSnapshot]:
+    """Запомнить состояние заказа до изменения"""
+    if order is None:
+        return None
+    return OrderSnapshot(
+        order_id=order.id,
+        client_id=order.client_id,
+        status=order.status,
+        delivery_date=order.delivery_date,
+        total_price=order.total_price or 0,
+        executor_id=order.executor_id,
+    )
+
+
+def sync_order_change(
+    session: Session,
+    before: Optional[OrderSnapshot],
+    after: Optional[Order]
+) -> None:
+    """
+    Обновить производные данные после создания (before=None),
+    изменения или удаления (after=None) заказа. Не коммитит.
+    Raises:
+        InsufficientStockError: заказ собран, а материалов не хватает
+    """
+    after_snapshot = snapshot(after)
+    if before != after_snapshot:
+        refresh_client_stats(
+            session,
+            {state.client_id for state in (before, after_snapshot) if state}
+        )
+
+        # Переход в "собран" списывает материалы, отмена — возвращает их
+        if after is not None and (before is None or before.status != after_snapshot.status):
+            if after_snapshot.status == OrderStatus.COLLECTED:
+                consume_for_order(session, after.id)
+            elif after_snapshot.status == OrderStatus.CANCELED:
+                release_for_order(session, after.id)
+
+    # Позиции заказа могли измениться и без изменения полей снимка
+    if after is not None:
+        refresh_reservations(session, after.id)
+    elif before is not None:
+        release_reservations(session, before.order_id)
+
+    # Дни доставки до и после: позиции и сумма могли измениться в любом из них
+    refresh_daily_sales(
+        session,
+        {order_day(state.delivery_date) for state in (before, after_snapshot) if state and state.delivery_date}
+    )
+    mark_changed(session, [state.delivery_date for state in (before, after_snapshot) if state])
+    invalidate(session, "orders")
+    if before != after_snapshot:
+        balancer.apply_order_change(before, after_snapshot)
@@ -0,0 +1,153 @@
+"""
+In-memory phone index for caller-ID lookup
+Номера хранятся как 11-значные числа в двух отсортированных массивах:
+по самому номеру (поиск по началу) и по перевернутому номеру (поиск по
+последним цифрам). Поиск — два бинарных поиска, без обращения к БД.
+
+Индекс загружается лениво при первом запросе, обновляется точечно при
+изменениях клиентов в этом процессе и полностью перечитывается раз в
+PHONE_INDEX_REFRESH_SECONDS, чтобы подхватить изменения других воркеров.
+"""
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+
+from sqlmodel import Session, select
+
+from app.core.config import PHONE_INDEX_REFRESH_SECONDS
+from app.models import Client
+
+PHONE_LENGTH = 11
+
+
+def normalize_phone_digits(phone: Optional[str]) -> Optional[str]:
+    """
+    Привести номер к 11 цифрам 7XXXXXXXXXX (правила ClientCreate).
+    Возвращает None для номеров, которые нельзя нормализовать.
+    """
+    if not phone:
+        return None
+    digits = re.sub(r"\D", "", phone)
+    if len(digits) == 11 and digits[0] in "78":
+        return "7" + digits[1:]
+    if len(digits) == 10:
+        return "7" + digits
+    return None
+
+
+class _SortedKeys:
+    """Отсортированные пары (ключ, client_id) в двух параллельных массивах"""
+
+    def __init__(self, pairs=()):
+        pairs = sorted(pairs)
+        self.keys = array("q", (key for key, _ in pairs))
+        self.ids = array("q", (client_id for _, client_id in pairs))
+
+    def add(self, key: int, client_id: int) -> None:
+        position = bisect_left(self.keys, key)
+        self.keys.insert(position, key)
+        self.ids.insert(position, client_id)
+
+    def remove(self, key: int, client_id: int) -> None:
+        position = bisect_left(self.keys, key)
+        while position < len(self.keys) and self.keys[position] == key:
+            if self.ids[position] == client_id:
+                del self.keys[position]
+                del self.ids[position]
+                return
+            position += 1
+
+    def prefix(self, digits: str, limit: int) -> List[int]:
+        """client_id всех ключей, 11-значная запись которых начинается с digits"""
+        scale = 10 ** (PHONE_LENGTH - len(digits))
+        low = int(digits) * scale
+        start = bisect_left(self.keys, low)
+        end = bisect_left(self.keys, low + scale)
+        return list(self.ids[start:min(end, start + limit)])
+
+
+class PhoneIndex:
+    """Индекс нормализованных телефонов клиентов"""
+
+    def __init__(self, refresh_seconds: int = PHONE_INDEX_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._forward: Optional[_SortedKeys] = None
+        self._reversed: Optional[_SortedKeys] = None
+        self._loaded_at = 0.0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._forward is not None
+
+    def load(self, session: Session) -> None:
+        """Полностью перечитать номера из БД"""
+        forward, backward = [], []
+        for client_id, phone in session.exec(select(Client.id, Client.phone)):
+            digits = normalize_phone_digits(phone)
+            if digits:
+                forward.append((int(digits), client_id))
+                backward.append((int(digits[::-1]), client_id))
+
+        forward_keys, reversed_keys = _SortedKeys(forward), _SortedKeys(backward)
+        with self._lock:
+            self._forward, self._reversed = forward_keys, reversed_keys
+            self._loaded_at = time.monotonic()
+
+    def ensure_fresh(self, session: Session) -> None:
+        """Загрузить индекс, если он еще не загружен или устарел"""
+        if not self.is_loaded or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self.load(session)
+
+    def add(self, client_id: int, phone: Optional[str]) -> None:
+        digits = normalize_phone_digits(phone)
+        if not digits or not self.is_loaded:
+            return
+        with self._lock:
+            self._forward.add(int(digits), client_id)
+            self._reversed.add(int(digits[::-1]), client_id)
+
+    def remove(self, client_id: int, phone: Optional[str]) -> None:
+        digits = normalize_phone_digits(phone)
+        if not digits or not self.is_loaded:
+            return
+        with self._lock:
+            self._forward.remove(int(digits), client_id)
+            self._reversed.remove(int(digits[::-1]), client_id)
+
+    def update(self, client_id: int, old_phone: Optional[str], new_phone: Optional[str]) -> None:
+        if old_phone != new_phone:
+            self.remove(client_id, old_phone)
+            self.add(client_id, new_phone)
+
+    def lookup(self, query: str, limit: int = 10) -> List[int]:
+        """
+        Найти client_id по полному номеру или его части.
+        Часть номера ищется как начало номера (с кодом страны или без,
+        с 8 вместо 7) и как последние цифры. Полные совпадения идут первыми.
+        """
+        digits = re.sub(r"\D", "", query or "")
+        if not digits or len(digits) > PHONE_LENGTH or not self.is_loaded:
+            return []
+
+        prefixes = [digits]
+        if digits[0] == "8":
+            prefixes.append("7" + digits[1:])
+        if len(digits) < PHONE_LENGTH:
+            prefixes.append("7" + digits)
+
+        found: List[int] = []
+        with self._lock:
+            for prefix in prefixes:
+                if len(prefix) <= PHONE_LENGTH:
+                    found.extend(self._forward.prefix(prefix, limit))
+            found.extend(self._reversed.prefix(digits[::-1], limit))
+
+        # Убираем повторы, сохраняя порядок
+        return list(dict.fromkeys(found))[:limit]
+
+
+phone_index = PhoneIndex()
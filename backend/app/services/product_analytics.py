@@ -0,0 +1,94 @@
+"""
+Product sales analytics for CRM Florist System
+Топ продуктов, доля категорий в выручке и средний чек за период.
+
+Все считается одним запросом: позиции живых и архивных заказов за
+UTC-диапазон дней магазина (по индексу delivery_date) группируются по
+продукту, а ранг продукта, выручка категории и общая выручка считаются
+оконными функциями над уже сгруппированными строками. Число заказов
+для среднего чека — скалярный подзапрос в том же SELECT.
+"""
+from datetime import date
+from typing import Dict
+
+from sqlalchemy import union_all
+from sqlmodel import Session, select, func
+
+from app.core.timebuckets import local_range
+from app.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatus, Product
+
+
+def _sold_items(date_from: date, date_to: date):
+    """Позиции неотмененных заказов (живых и архивных) с доставкой в дни date_from..date_to"""
+    branches = [
+        select(
+            item_model.order_id.label("order_id"),
+            item_model.product_id.label("product_id"),
+            item_model.quantity.label("quantity"),
+            (item_model.quantity * item_model.price).label("revenue"),
+        )
+        .join(model, model.id == item_model.order_id)
+        .where(model.status != OrderStatus.CANCELED, *local_range(model.delivery_date, date_from, date_to))
+        for model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+    ]
+    return union_all(*branches).subquery("sold_items")
+
+
+def product_analytics(session: Session, date_from: date, date_to: date, limit: int = 10) -> Dict:
+    """Топ-N продуктов по выручке, доли категорий и средний чек за дни date_from..date_to"""
+    items = _sold_items(date_from, date_to)
+    revenue = func.sum(items.c.revenue)
+    orders_total = select(func.count(func.distinct(items.c.order_id))).scalar_subquery()
+
+    rows = session.exec(
+        select(
+            items.c.product_id,
+            Product.name,
+            Product.category,
+            func.sum(items.c.quantity),
+            func.count(func.distinct(items.c.order_id)),
+            revenue,
+            func.rank().over(order_by=revenue.desc()),
+            func.sum(revenue).over(partition_by=Product.category),
+            func.sum(revenue).over(),
+            orders_total,
+        )
+        .select_from(items)
+        .outerjoin(Product, Product.id == items.c.product_id)
+        .group_by(items.c.product_id, Product.name, Product.category)
+        .order_by(revenue.desc())
+    ).all()
+
+    total_revenue = rows[0][8] if rows else 0
+    orders_count = rows[0][9] if rows else 0
+    units = sum(row[3] for row in rows)
+
+    def share(value):
+        return round(value / total_revenue * 100, 2) if total_revenue else 0.0
+
+    categories = {}
+    for row in rows:
+        categories.setdefault(row[2], {"category": row[2], "revenue": row[7], "revenue_share": share(row[7])})
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "total_revenue": total_revenue,
+        "orders_count": orders_count,
+        "average_basket_value": round(total_revenue / orders_count, 2) if orders_count else 0,
+        "average_basket_items": round(units / orders_count, 2) if orders_count else 0,
+        "top_products": [
+            {
+                "rank": rank,
+                "product_id": product_id,
+                "name": name,
+                "category": category,
+                "units_sold": units_sold,
+                "orders_count": product_orders,
+                "revenue": product_revenue,
+                "revenue_share": share(product_revenue),
+            }
+            for product_id, name, category, units_sold, product_orders, product_revenue, rank, *_ in rows[:limit]
+        ],
+        "categories": sorted(categories.values(), key=lambda category: category["revenue"], reverse=True),
+    }
@@ -0,0 +1,54 @@
+"""
+Product material cost rollup for CRM Florist System
+Себестоимость материалов каждого продукта по его составу (product_inventory)
+и цене за единицу на складе. Весь каталог считается одним запросом
+с LEFT JOIN и GROUP BY, без запросов на каждый продукт.
+"""
+from typing import Dict, List
+
+from sqlmodel import Session, select, func
+
+from app.models import Product, ProductInventory, Inventory
+
+
+def cost_rollup(session: Session) -> List[Dict]:
+    """
+    Себестоимость и маржа по всем продуктам.
+    Материалы без цены за единицу в сумму не входят и считаются
+    в unpriced_components, чтобы неполная себестоимость была видна.
+    """
+    line_cost = ProductInventory.quantity_needed * Inventory.price_per_unit
+    query = (
+        select(
+            Product.id,
+            Product.name,
+            Product.category,
+            Product.price,
+            func.coalesce(func.sum(line_cost), 0).label("material_cost"),
+            func.count(ProductInventory.id).label("components"),
+            (func.count(ProductInventory.id) - func.count(Inventory.price_per_unit)).label("unpriced"),
+        )
+        .select_from(Product)
+        .outerjoin(ProductInventory, ProductInventory.product_id == Product.id)
+        .outerjoin(Inventory, Inventory.id == ProductInventory.inventory_id)
+        .group_by(Product.id, Product.name, Product.category, Product.price)
+        .order_by(Product.id)
+    )
+
+    rollup = []
+    for product_id, name, category, price, material_cost, components, unpriced in session.exec(query):
+        price = price or 0
+        material_cost = round(float(material_cost), 2)
+        margin = round(price - material_cost, 2)
+        rollup.append({
+            "product_id": product_id,
+            "name": name,
+            "category": category,
+            "price": price,
+            "material_cost": material_cost,
+            "margin": margin,
+            "margin_percent": round(margin / price * 100, 2) if price else None,
+            "components": components,
+            "unpriced_components": unpriced,
+        })
+    return rollup
@@ -0,0 +1,152 @@
+"""
+Faceted product search for CRM Florist System
+Страница каталога и счетчики фасетов (категория, ценовой диапазон,
+наличие) для текущего фильтра.
+
+Счетчики считаются одним GROUP BY по (категория, диапазон цены, наличие,
+попадание в выбранный диапазон цен). Фасеты дизъюнктивные: счетчики
+фасета учитывают все фильтры, кроме его собственного, то есть показывают,
+сколько товаров будет найдено при выборе другого значения.
+"""
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, case, true
+from sqlmodel import Session, select, func
+
+from app.core.config import PRICE_FACET_EDGES
+from app.models import Product, ProductCategory, ProductInventory, Inventory
+from app.services import search as fulltext
+
+
+def apply_search(session: Session, query, search: Optional[str]):
+    """
+    Добавить к запросу продуктов текстовый поиск.
+    Возвращает None, если полнотекстовый поиск ничего не нашел.
+    """
+    if not search:
+        return query
+    if fulltext.is_supported(session):
+        ranked = fulltext.ranked_ids(session, Product.__tablename__, search)
+        if ranked is None:
+            return None
+        return query.join(ranked, ranked.c.id == Product.id).order_by(ranked.c.rank)
+    return query.where(
+        (Product.name.ilike(f"%{search}%")) |
+        (Product.description.ilike(f"%{search}%"))
+    )
+
+
+def in_stock_expression():
+    """Продукт в наличии: остаток каждого материала состава не меньше нормы"""
+    shortage = (
+        select(ProductInventory.id)
+        .outerjoin(Inventory, Inventory.id == ProductInventory.inventory_id)
+        .where(
+            ProductInventory.product_id == Product.id,
+            func.coalesce(Inventory.quantity, 0) < ProductInventory.quantity_needed
+        )
+    )
+    return ~shortage.exists()
+
+
+def price_bucket_expression(edges: List[float]):
+    """Номер ценового диапазона: 0 — дешевле edges[0], len(edges) — дороже последней границы"""
+    return case(
+        *[(Product.price < edge, index) for index, edge in enumerate(edges)],
+        else_=len(edges)
+    )
+
+
+def faceted_search(
+    session: Session,
+    category: Optional[ProductCategory] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+    search: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 50,
+    edges: List[float] = PRICE_FACET_EDGES
+) -> Dict:
+    """Страница продуктов, общее число и счетчики фасетов"""
+    price_conditions = []
+    if min_price is not None:
+        price_conditions.append(Product.price >= min_price)
+    if max_price is not None:
+        price_conditions.append(Product.price <= max_price)
+    in_price_range = and_(*price_conditions) if price_conditions else true()
+
+    groups = []
+    facet_query = apply_search(session, select(
+        Product.category,
+        price_bucket_expression(edges).label("price_bucket"),
+        in_stock_expression().label("in_stock"),
+        case((in_price_range, True), else_=False).label("in_price_range"),
+        func.count().label("products"),
+    ), search)
+    if facet_query is not None:
+        facet_query = facet_query.group_by(
+            Product.category, "price_bucket", "in_stock", "in_price_range"
+        ).order_by(None)
+        groups = [
+            (row_category, bucket, bool(row_in_stock), bool(row_in_range), products)
+            for row_category, bucket, row_in_stock, row_in_range, products in session.exec(facet_query)
+        ]
+
+    def count_groups(skip_facet: Optional[str] = None, **match) -> int:
+        total = 0
+        for row_category, bucket, row_in_stock, row_in_range, products in groups:
+            if skip_facet != "category" and category is not None and row_category != category:
+                continue
+            if skip_facet != "price" and not row_in_range:
+                continue
+            if skip_facet != "in_stock" and in_stock is not None and row_in_stock != in_stock:
+                continue
+            if "category" in match and row_category != match["category"]:
+                continue
+            if "bucket" in match and bucket != match["bucket"]:
+                continue
+            if "in_stock" in match and row_in_stock != match["in_stock"]:
+                continue
+            total += products
+        return total
+
+    total = count_groups()
+    items = []
+    if total:
+        page_query = apply_search(session, select(Product), search)
+        if category is not None:
+            page_query = page_query.where(Product.category == category)
+        if price_conditions:
+            page_query = page_query.where(*price_conditions)
+        if in_stock is not None:
+            page_query = page_query.where(in_stock_expression() if in_stock else ~in_stock_expression())
+        page_query = page_query.order_by(Product.id).offset(skip).limit(limit)
+        items = session.exec(page_query).all()
+
+    bounds = [None, *edges, None]
+    return {
+        "items": items,
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "facets": {
+            "category": [
+                {"value": value, "count": count_groups("category", category=value)}
+                for value in ProductCategory
+            ],
+            "price": [
+                {
+                    "bucket": bucket,
+                    "min": bounds[bucket],
+                    "max": bounds[bucket + 1],
+                    "count": count_groups("price", bucket=bucket),
+                }
+                for bucket in range(len(edges) + 1)
+            ],
+            "in_stock": [
+                {"value": value, "count": count_groups("in_stock", in_stock=value)}
+                for value in (True, False)
+            ],
+        },
+    }
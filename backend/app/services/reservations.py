@@ -0,0 +1,154 @@
+"""
+Forward stock reservations for CRM Florist System
+Открытые заказы (новый, оплачен, в работе) резервируют материалы по составу
+своих продуктов к дате доставки. Резерв пересчитывается при каждом
+изменении заказа и снимается, когда заказ собран (материалы списаны),
+отменен или удален.
+
+Прогноз доступности (available-to-promise) по дням считается одной
+агрегацией резервов по (материал, день), без обхода заказов.
+
+Полная перестройка резервов:
+    python -m app.services.reservations
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, literal
+from sqlmodel import Session, select, func
+
+from app.core.timebuckets import bucket_case, buckets, local_range, local_today
+from app.models import (
+    Inventory, InventoryTransaction, InventoryTransactionType, Order, OrderItem,
+    OrderStatus, ProductInventory, StockReservation
+)
+
+# Статусы, в которых материалы нужны, но еще не списаны
+RESERVING_STATUSES = (OrderStatus.NEW, OrderStatus.PAID, OrderStatus.IN_WORK)
+
+_COLUMNS = ["order_id", "inventory_id", "quantity", "delivery_date", "created_at"]
+
+
+def _reservations_select(order_ids: Optional[List[int]] = None):
+    """SELECT резервов: позиции открытых заказов x состав продуктов"""
+    consumed = (
+        select(InventoryTransaction.inventory_id)
+        .where(
+            InventoryTransaction.reference_type == "order",
+            InventoryTransaction.reference_id == Order.id,
+            InventoryTransaction.transaction_type == InventoryTransactionType.CONSUMPTION,
+        )
+        .group_by(InventoryTransaction.inventory_id)
+        .having(func.sum(InventoryTransaction.quantity) < 0)
+        .exists()
+    )
+    query = (
+        select(
+            Order.id,
+            ProductInventory.inventory_id,
+            func.sum(OrderItem.quantity * ProductInventory.quantity_needed),
+            Order.delivery_date,
+            literal(datetime.utcnow()),
+        )
+        .select_from(Order)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(ProductInventory, ProductInventory.product_id == OrderItem.product_id)
+        .where(Order.status.in_(RESERVING_STATUSES), ~consumed)
+        .group_by(Order.id, ProductInventory.inventory_id, Order.delivery_date)
+    )
+    if order_ids is not None:
+        query = query.where(Order.id.in_(order_ids))
+    return query
+
+
+def refresh_reservations(session: Session, order_id: int) -> None:
+    """Пересчитать резерв заказа по его текущим позициям и статусу. Не коммитит."""
+    session.flush()
+    session.execute(delete(StockReservation).where(StockReservation.order_id == order_id))
+    session.execute(insert(StockReservation).from_select(_COLUMNS, _reservations_select([order_id])))
+
+
+def release_reservations(session: Session, order_id: int) -> None:
+    """Снять резерв удаленного заказа. Не коммитит."""
+    session.execute(delete(StockReservation).where(StockReservation.order_id == order_id))
+
+
+def rebuild_reservations(session: Session) -> int:
+    """Перестроить все резервы одним INSERT ... SELECT"""
+    session.execute(delete(StockReservation))
+    session.execute(insert(StockReservation).from_select(_COLUMNS, _reservations_select()))
+    session.commit()
+    return session.exec(select(func.count()).select_from(StockReservation)).one()
+
+
+def ensure_reservations(session: Session) -> None:
+    """Заполнить резервы, если таблица пуста, а открытые заказы уже есть"""
+    has_reservations = session.exec(select(StockReservation.id).limit(1)).first()
+    has_open_orders = session.exec(
+        select(Order.id).where(Order.status.in_(RESERVING_STATUSES)).limit(1)
+    ).first()
+    if has_open_orders and not has_reservations:
+        rebuild_reservations(session)
+
+
+def projected_availability(
+    session: Session,
+    days: int,
+    start: Optional[date] = None,
+    inventory_ids: Optional[List[int]] = None
+) -> Dict:
+    """
+    Доступно к обещанию по дням: остаток минус резервы с доставкой
+    до конца дня включительно. Просроченные резервы относятся к первому дню.
+    """
+    start = start or local_today()
+    day_buckets = buckets(start, start + timedelta(days=days - 1), "day")
+
+    day = bucket_case(StockReservation.delivery_date, day_buckets)
+    reserved_query = (
+        select(StockReservation.inventory_id, day, func.sum(StockReservation.quantity))
+        .where(*local_range(StockReservation.delivery_date, last=day_buckets[-1].start.date()))
+        .group_by(StockReservation.inventory_id, day)
+    )
+    items_query = select(Inventory.id, Inventory.name, Inventory.unit, Inventory.quantity).order_by(Inventory.id)
+    if inventory_ids is not None:
+        reserved_query = reserved_query.where(StockReservation.inventory_id.in_(inventory_ids))
+        items_query = items_query.where(Inventory.id.in_(inventory_ids))
+
+    reserved: Dict[int, List[float]] = {}
+    for inventory_id, offset, quantity in session.exec(reserved_query):
+        # Просроченные резервы (до первого дня) не попадают ни в один интервал
+        reserved.setdefault(inventory_id, [0.0] * days)[offset or 0] += quantity
+
+    dates = [bucket.start.date() for bucket in day_buckets]
+    items = []
+    for inventory_id, name, unit, on_hand in session.exec(items_query):
+        by_day = reserved.get(inventory_id, [0.0] * days)
+        available = on_hand or 0
+        projection = []
+        shortage_date = None
+        for current, quantity in zip(dates, by_day):
+            available -= quantity
+            projection.append({"date": current, "reserved": quantity, "available": available})
+            if available < 0 and shortage_date is None:
+                shortage_date = current
+        items.append({
+            "inventory_id": inventory_id,
+            "name": name,
+            "unit": unit,
+            "on_hand": on_hand,
+            "reserved_total": sum(by_day),
+            "shortage_date": shortage_date,
+            "days": projection,
+        })
+
+    return {"start": start, "days": days, "items": items}
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        rows = rebuild_reservations(session)
+    print(f"✅ Резервы материалов перестроены: {rows}")
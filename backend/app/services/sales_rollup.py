@@ -0,0 +1,146 @@
+"""
+Daily sales rollup for CRM Florist System
+Таблица daily_sales хранит по строке на (день доставки по времени магазина,
+статус): число заказов, выручку и число единиц в позициях. Архивные заказы
+учитываются наравне с живыми, поэтому отчет по продажам не обращается к архиву.
+
+При записи заказа пересчитываются только затронутые дни (день доставки
+до и после изменения) в той же транзакции; выборка дня идет по UTC-диапазону
+delivery_date и использует индекс. Полная перестройка или ремонт диапазона:
+    python -m app.services.sales_rollup [--date-from 2024-01-01] [--date-to 2024-12-31]
+"""
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, insert, literal, union_all
+from sqlmodel import Session, select, func
+
+from app.core.timebuckets import Bucket, bucket_case, buckets, local_today, to_local
+from app.models import ArchivedOrder, ArchivedOrderItem, DailySales, Order, OrderItem
+
+_COLUMNS = ["day", "status", "orders_count", "revenue", "items_count", "updated_at"]
+
+# Дней в одном INSERT ... SELECT при перестройке (размер CASE по дням)
+_REBUILD_CHUNK_DAYS = 31
+
+
+def sales_orders(utc_start: Optional[datetime] = None, utc_end: Optional[datetime] = None):
+    """
+    Живые и архивные заказы с числом единиц в позициях, доставка в [utc_start, utc_end).
+    Колонки: delivery_date, status, total_price, items_count.
+    """
+    branches = []
+    for model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        items = (
+            select(func.coalesce(func.sum(item_model.quantity), 0))
+            .where(item_model.order_id == model.id)
+            .scalar_subquery()
+        )
+        branch = select(
+            model.delivery_date.label("delivery_date"),
+            model.status.label("status"),
+            func.coalesce(model.total_price, 0).label("total_price"),
+            items.label("items_count"),
+        )
+        if utc_start is not None:
+            branch = branch.where(model.delivery_date >= utc_start)
+        if utc_end is not None:
+            branch = branch.where(model.delivery_date < utc_end)
+        branches.append(branch)
+    return union_all(*branches).subquery("sales_orders")
+
+
+def _write_days(session: Session, days: List[Bucket]) -> None:
+    """Заменить строки подряд идущих дней одним DELETE и одним INSERT ... SELECT"""
+    orders = sales_orders(days[0].utc_start, days[-1].utc_end)
+    day = bucket_case(orders.c.delivery_date, days, [bucket.start.date() for bucket in days])
+    rollup = (
+        select(
+            day,
+            orders.c.status,
+            func.count(),
+            func.sum(orders.c.total_price),
+            func.sum(orders.c.items_count),
+            literal(datetime.utcnow()),
+        )
+        .group_by(day, orders.c.status)
+    )
+    session.execute(delete(DailySales).where(
+        DailySales.day >= days[0].start.date(), DailySales.day <= days[-1].start.date()
+    ))
+    session.execute(insert(DailySales).from_select(_COLUMNS, rollup))
+
+
+def order_day(delivery_date: datetime) -> date:
+    """День доставки по времени магазина — ключ daily_sales"""
+    return to_local(delivery_date).date()
+
+
+def refresh_daily_sales(session: Session, days: Iterable[date]) -> None:
+    """
+    Пересчитать строки указанных дней (по времени магазина).
+    Не коммитит — вызывается внутри транзакции, изменившей заказы.
+    """
+    days = sorted(set(days))
+    if not days:
+        return
+
+    session.flush()
+    for day in days:
+        _write_days(session, buckets(day, day, "day"))
+
+
+def rebuild_daily_sales(
+    session: Session,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+) -> int:
+    """Перестроить daily_sales целиком или за диапазон дней (ремонт)"""
+    first, last = _order_days_span(session)
+    if date_from is None and date_to is None:
+        session.execute(delete(DailySales))
+    first, last = date_from or first, date_to or last
+
+    while first <= last:
+        chunk_last = min(first + timedelta(days=_REBUILD_CHUNK_DAYS - 1), last)
+        _write_days(session, buckets(first, chunk_last, "day"))
+        first = chunk_last + timedelta(days=1)
+    session.commit()
+    return session.exec(select(func.count()).select_from(DailySales)).one()
+
+
+def _order_days_span(session: Session) -> Tuple[date, date]:
+    """Первый и последний день доставки среди живых и архивных заказов"""
+    bounds = [
+        session.exec(select(func.min(model.delivery_date), func.max(model.delivery_date))).one()
+        for model in (Order, ArchivedOrder)
+    ]
+    earliest = [low for low, _ in bounds if low is not None]
+    latest = [high for _, high in bounds if high is not None]
+    if not earliest:
+        today = local_today()
+        return today, today
+    return order_day(min(earliest)), order_day(max(latest))
+
+
+def ensure_daily_sales(session: Session) -> None:
+    """Заполнить daily_sales, если таблица пуста, а заказы уже есть"""
+    has_rollup = session.exec(select(DailySales.day).limit(1)).first()
+    has_orders = session.exec(select(Order.id).limit(1)).first()
+    if has_orders and not has_rollup:
+        rebuild_daily_sales(session)
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Rebuild the daily sales rollup")
+    parser.add_argument("--date-from", type=date.fromisoformat, default=None)
+    parser.add_argument("--date-to", type=date.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        rows = rebuild_daily_sales(session, args.date_from, args.date_to)
+    print(f"✅ Дневные продажи перестроены: {rows} строк")
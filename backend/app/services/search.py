@@ -0,0 +1,180 @@
+"""
+Full-text search for CRM Florist System
+Полнотекстовый индекс по клиентам, заказам и продуктам.
+
+SQLite: отдельные FTS5-таблицы (<таблица>_fts, rowid = id записи),
+синхронизируются триггерами на INSERT/UPDATE/DELETE.
+PostgreSQL: GIN-индексы по выражению to_tsvector('simple', ...).
+Буква "ё" приводится к "е" и в индексе, и в запросе.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text, Integer, Float
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+
+# Индексируемые колонки по таблицам
+SEARCH_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "clients": ("name", "phone", "email", "notes"),
+    "products": ("name", "description"),
+    "orders": ("delivery_address", "comment"),
+}
+
+_PHONE_QUERY = re.compile(r"^[\d\s+()\-]+$")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _fold(value: str) -> str:
+    return value.replace("ё", "е").replace("Ё", "Е")
+
+
+def _sqlite_fold(expr: str) -> str:
+    return f"replace(replace(coalesce({expr}, ''), 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _pg_document(table: str) -> str:
+    parts = " || ' ' || ".join(
+        f"translate(coalesce({column}, ''), 'ёЁ', 'еЕ')" for column in SEARCH_FIELDS[table]
+    )
+    return f"to_tsvector('simple', {parts})"
+
+
+def _sqlite_ddl(table: str) -> List[str]:
+    fields = SEARCH_FIELDS[table]
+    fts = f"{table}_fts"
+    columns = ", ".join(fields)
+    new_values = ", ".join(_sqlite_fold(f"new.{field}") for field in fields)
+    update_of = ", ".join(fields)
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{columns}, tokenize='unicode61 remove_diacritics 2')",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {fts} WHERE rowid = old.id; END",
+
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {update_of} ON {table} BEGIN "
+        f"DELETE FROM {fts} WHERE rowid = old.id; "
+        f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def _sqlite_rebuild(table: str) -> List[str]:
+    fields = SEARCH_FIELDS[table]
+    fts = f"{table}_fts"
+    values = ", ".join(_sqlite_fold(field) for field in fields)
+    return [
+        f"DELETE FROM {fts}",
+        f"INSERT INTO {fts}(rowid, {', '.join(fields)}) SELECT id, {values} FROM {table}",
+    ]
+
+
+def ensure_search_index(engine: Engine) -> None:
+    """
+    Создать полнотекстовые индексы и триггеры, если их еще нет.
+    Для новых FTS5-таблиц сразу заполняет индекс существующими данными.
+    """
+    dialect = engine.dialect.name
+
+    with engine.begin() as connection:
+        for table in SEARCH_FIELDS:
+            if dialect == "sqlite":
+                exists = connection.exec_driver_sql(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                    (f"{table}_fts",)
+                ).first()
+                for statement in _sqlite_ddl(table):
+                    connection.exec_driver_sql(statement)
+                if not exists:
+                    for statement in _sqlite_rebuild(table):
+                        connection.exec_driver_sql(statement)
+            elif dialect == "postgresql":
+                connection.exec_driver_sql(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_fts ON {table} "
+                    f"USING GIN ({_pg_document(table)})"
+                )
+
+
+def rebuild_search_index(engine: Engine) -> None:
+    """Полностью перестроить FTS5-таблицы (для SQLite)"""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as connection:
+        for table in SEARCH_FIELDS:
+            for statement in _sqlite_rebuild(table):
+                connection.exec_driver_sql(statement)
+
+
+def is_supported(session: Session) -> bool:
+    """Поддерживает ли текущая БД полнотекстовый поиск"""
+    return session.get_bind().dialect.name in ("sqlite", "postgresql")
+
+
+def _tokens(query: str) -> List[str]:
+    """Разбить пользовательский запрос на слова; телефон — одним токеном"""
+    query = _fold(query.strip())
+    if _PHONE_QUERY.match(query):
+        digits = re.sub(r"\D", "", query)
+        if len(digits) == 11 and digits.startswith("8"):
+            digits = "7" + digits[1:]
+        return [digits] if digits else []
+    return [token.lower() for token in _WORD.findall(query)]
+
+
+def ranked_ids(session: Session, table: str, query: str):
+    """
+    Подзапрос (id, rank) записей таблицы, подходящих под запрос.
+    Каждое слово ищется как префикс; меньший rank — более релевантная запись.
+    Возвращает None, если в запросе нет слов.
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return None
+
+    if session.get_bind().dialect.name == "postgresql":
+        ts_query = " & ".join(f"{token}:*" for token in tokens)
+        statement = text(
+            f"SELECT id, -ts_rank({_pg_document(table)}, to_tsquery('simple', :q)) AS rank "
+            f"FROM {table} WHERE {_pg_document(table)} @@ to_tsquery('simple', :q)"
+        ).bindparams(q=ts_query)
+    else:
+        match = " ".join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+        statement = text(
+            f"SELECT rowid AS id, bm25({table}_fts) AS rank "
+            f"FROM {table}_fts WHERE {table}_fts MATCH :q"
+        ).bindparams(q=match)
+
+    return statement.columns(id=Integer, rank=Float).subquery(f"{table}_search")
+
+
+def search(session: Session, model, query: str, limit: int = 20) -> List:
+    """Найти записи модели по запросу, отсортированные по релевантности"""
+    ranked = ranked_ids(session, model.__tablename__, query)
+    if ranked is None:
+        return []
+
+    statement = (
+        select(model)
+        .join(ranked, ranked.c.id == model.id)
+        .order_by(ranked.c.rank)
+        .limit(limit)
+    )
+    return session.exec(statement).all()
+
+
+def looks_like_phone(query: Optional[str]) -> bool:
+    """Состоит ли запрос только из цифр и символов телефонного номера"""
+    return bool(query) and bool(_PHONE_QUERY.match(query.strip()))
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    create_db_and_tables()
+    rebuild_search_index(engine)
+    print("✅ Полнотекстовый индекс перестроен")
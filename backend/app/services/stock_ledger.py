@@ -0,0 +1,384 @@
+"""
+Inventory ledger for CRM Florist System
+Все изменения остатков проходят через apply_deltas(): inventory.quantity
+меняется на величину движения, а в журнал inventory_transactions
+добавляется строка с остатком после движения. Журнал только дополняется,
+поэтому позицию с движениями удалить нельзя; inventory.quantity — кэш
+суммы движений по позиции.
+
+Каждые INVENTORY_SNAPSHOT_INTERVAL транзакций сохраняется снимок остатков
+всех позиций. Остаток на момент времени = последний снимок до этого
+момента плюс движения после него, журнал с начала не перечитывается.
+
+Сборка заказа списывает материалы по составу продуктов одним условным
+UPDATE: либо хватает всех материалов и списываются все, либо не меняется
+ничего и возвращается список нехватки. Отмена собранного заказа
+возвращает ровно то, что было списано по журналу.
+
+Снимок вручную:
+    python -m app.services.stock_ledger snapshot
+"""
+import argparse
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, delete, insert, literal, update
+from sqlmodel import Session, select, func
+
+from app.core.cache import invalidate
+from app.core.config import INVENTORY_SNAPSHOT_INTERVAL
+from app.services.low_stock import track_low_stock
+from app.models import (
+    Inventory, InventoryTransaction, InventorySnapshot, InventoryTransactionType,
+    InventoryAuditItem, OrderItem, ProductInventory
+)
+
+
+class InsufficientStockError(ValueError):
+    """Материалов на складе меньше, чем требуется; shortages — что и сколько"""
+
+    def __init__(self, shortages: List[Dict]):
+        super().__init__("Not enough stock")
+        self.shortages = shortages
+
+
+def apply_deltas(
+    session: Session,
+    deltas: Dict[int, float],
+    transaction_type: InventoryTransactionType,
+    comment: Optional[str] = None,
+    reference_type: Optional[str] = None,
+    reference_id: Optional[int] = None
+) -> List[InventoryTransaction]:
+    """
+    Провести движения {inventory_id: изменение} одной пачкой.
+    Не коммитит — вызывается внутри транзакции, которая их вызвала.
+    """
+    deltas = {inventory_id: delta for inventory_id, delta in deltas.items() if delta}
+    if not deltas:
+        return []
+
+    session.flush()
+    inventory = Inventory.__table__
+    session.execute(
+        update(inventory)
+        .where(inventory.c.id == bindparam("item_id"))
+        .values(quantity=inventory.c.quantity + bindparam("delta")),
+        [{"item_id": inventory_id, "delta": delta} for inventory_id, delta in deltas.items()]
+    )
+    return _record(session, deltas, transaction_type, comment, reference_type, reference_id)
+
+
+def _record(
+    session: Session,
+    deltas: Dict[int, float],
+    transaction_type: InventoryTransactionType,
+    comment: Optional[str],
+    reference_type: Optional[str],
+    reference_id: Optional[int]
+) -> List[InventoryTransaction]:
+    """Записать в журнал движения, уже примененные к inventory.quantity"""
+    # Загруженные в сессию позиции должны перечитать остаток
+    for instance in list(session.identity_map.values()):
+        if isinstance(instance, Inventory) and instance.id in deltas:
+            session.expire(instance, ["quantity"])
+
+    balances = dict(session.exec(
+        select(Inventory.id, Inventory.quantity).where(Inventory.id.in_(list(deltas)))
+    ).all())
+    now = datetime.utcnow()
+    transactions = [
+        InventoryTransaction(
+            inventory_id=inventory_id,
+            transaction_type=transaction_type,
+            quantity=delta,
+            balance_after=balances[inventory_id],
+            comment=comment,
+            reference_type=reference_type,
+            reference_id=reference_id,
+            created_at=now,
+        )
+        for inventory_id, delta in sorted(deltas.items())
+    ]
+    session.add_all(transactions)
+    session.flush()
+
+    first_id = min(transaction.id for transaction in transactions)
+    last_id = max(transaction.id for transaction in transactions)
+    if last_id // INVENTORY_SNAPSHOT_INTERVAL > (first_id - 1) // INVENTORY_SNAPSHOT_INTERVAL:
+        take_snapshot(session)
+
+    track_low_stock(session, deltas)
+    invalidate(session, "stock")
+    return transactions
+
+
+def apply_set_deltas(
+    session: Session,
+    deltas_query,
+    transaction_type: InventoryTransactionType,
+    comment: Optional[str] = None,
+    reference_type: Optional[str] = None,
+    reference_id: Optional[int] = None,
+    check_stock: bool = True
+) -> List[InventoryTransaction]:
+    """
+    Провести движения, заданные подзапросом (inventory_id, delta), одним UPDATE.
+    С check_stock UPDATE условный: если хотя бы одна позиция ушла бы в минус,
+    не меняется ни одна строка и выбрасывается InsufficientStockError.
+    Не коммитит.
+    """
+    session.flush()
+    deltas = {
+        inventory_id: delta
+        for inventory_id, delta in session.exec(select(deltas_query.c.inventory_id, deltas_query.c.delta))
+        if delta
+    }
+    if not deltas:
+        return []
+
+    inventory = Inventory.__table__
+    stock = inventory.alias("stock")
+    delta_for_row = (
+        select(deltas_query.c.delta)
+        .where(deltas_query.c.inventory_id == inventory.c.id)
+        .scalar_subquery()
+    )
+    statement = (
+        update(inventory)
+        .where(inventory.c.id.in_(select(deltas_query.c.inventory_id)))
+        .values(quantity=inventory.c.quantity + delta_for_row)
+    )
+    if check_stock:
+        shortage = (
+            select(deltas_query.c.inventory_id)
+            .select_from(deltas_query.outerjoin(stock, stock.c.id == deltas_query.c.inventory_id))
+            .where(func.coalesce(stock.c.quantity, 0) + deltas_query.c.delta < 0)
+        )
+        statement = statement.where(~shortage.exists())
+
+    updated = session.execute(statement).rowcount
+    if check_stock and not updated:
+        raise InsufficientStockError(_shortages(session, deltas))
+    if updated != len(deltas):
+        # Удаленные со склада позиции пропускаются
+        existing = set(session.exec(select(Inventory.id).where(Inventory.id.in_(list(deltas)))).all())
+        deltas = {inventory_id: delta for inventory_id, delta in deltas.items() if inventory_id in existing}
+
+    return _record(session, deltas, transaction_type, comment, reference_type, reference_id)
+
+
+def _shortages(session: Session, deltas: Dict[int, float]) -> List[Dict]:
+    items = {
+        inventory_id: (name, quantity)
+        for inventory_id, name, quantity in session.exec(
+            select(Inventory.id, Inventory.name, Inventory.quantity).where(Inventory.id.in_(list(deltas)))
+        )
+    }
+    shortages = []
+    for inventory_id, delta in sorted(deltas.items()):
+        name, available = items.get(inventory_id, (None, 0))
+        if (available or 0) + delta < 0:
+            shortages.append({
+                "inventory_id": inventory_id,
+                "name": name,
+                "required": -delta,
+                "available": available or 0,
+            })
+    return shortages
+
+
+def _order_consumption(order_id: int):
+    """Подзапрос (inventory_id, delta): чистое списание по заказу из журнала"""
+    return (
+        select(
+            InventoryTransaction.inventory_id.label("inventory_id"),
+            func.sum(InventoryTransaction.quantity).label("delta"),
+        )
+        .where(
+            InventoryTransaction.reference_type == "order",
+            InventoryTransaction.reference_id == order_id,
+            InventoryTransaction.transaction_type == InventoryTransactionType.CONSUMPTION,
+        )
+        .group_by(InventoryTransaction.inventory_id)
+    )
+
+
+def is_consumed(session: Session, order_id: int) -> bool:
+    """Списаны ли уже материалы заказа (и не возвращены)"""
+    consumed = _order_consumption(order_id).having(func.sum(InventoryTransaction.quantity) < 0)
+    return session.exec(select(func.count()).select_from(consumed.subquery())).one() > 0
+
+
+def consume_for_order(session: Session, order_id: int) -> List[InventoryTransaction]:
+    """
+    Списать материалы собранного заказа: позиции заказа раскладываются
+    по составу продуктов и списываются одним условным UPDATE.
+    Raises:
+        InsufficientStockError: если хотя бы одного материала не хватает
+    """
+    if is_consumed(session, order_id):
+        return []
+    requirements = (
+        select(
+            ProductInventory.inventory_id.label("inventory_id"),
+            (-func.sum(OrderItem.quantity * ProductInventory.quantity_needed)).label("delta"),
+        )
+        .join(ProductInventory, ProductInventory.product_id == OrderItem.product_id)
+        .where(OrderItem.order_id == order_id)
+        .group_by(ProductInventory.inventory_id)
+        .subquery("requirements")
+    )
+    return apply_set_deltas(
+        session, requirements, InventoryTransactionType.CONSUMPTION,
+        f"Списано на заказ #{order_id}", "order", order_id
+    )
+
+
+def release_for_order(session: Session, order_id: int) -> List[InventoryTransaction]:
+    """Вернуть на склад все, что было списано на заказ (отмена)"""
+    consumed = (
+        _order_consumption(order_id)
+        .having(func.sum(InventoryTransaction.quantity) < 0)
+        .subquery("consumed")
+    )
+    returned = select(consumed.c.inventory_id, (-consumed.c.delta).label("delta")).subquery("returned")
+    return apply_set_deltas(
+        session, returned, InventoryTransactionType.CONSUMPTION,
+        f"Возврат материалов: заказ #{order_id} отменен", "order", order_id,
+        check_stock=False
+    )
+
+
+def take_snapshot(session: Session) -> int:
+    """Сохранить остатки всех позиций на последнюю транзакцию журнала"""
+    last_id = session.exec(select(func.max(InventoryTransaction.id))).one()
+    if not last_id:
+        return 0
+    session.execute(insert(InventorySnapshot).from_select(
+        ["inventory_id", "balance", "last_transaction_id", "taken_at"],
+        select(Inventory.id, Inventory.quantity, literal(last_id), literal(datetime.utcnow()))
+    ))
+    return last_id
+
+
+def balances_at(
+    session: Session,
+    at: datetime,
+    inventory_ids: Optional[Iterable[int]] = None
+) -> Dict[int, float]:
+    """
+    Остатки на момент at: последний снимок до at плюс движения после него
+    (не дальше следующего снимка, поэтому читается один интервал журнала).
+    Позиции без движений до at в результат не попадают (остаток 0).
+    """
+    if inventory_ids is not None:
+        inventory_ids = list(inventory_ids)
+
+    base_id = session.exec(
+        select(func.max(InventorySnapshot.last_transaction_id))
+        .where(InventorySnapshot.taken_at <= at)
+    ).one() or 0
+    # Первый снимок после at ограничивает повтор журнала сверху
+    next_base_id = session.exec(
+        select(func.min(InventorySnapshot.last_transaction_id))
+        .where(InventorySnapshot.taken_at > at)
+    ).one()
+
+    balances: Dict[int, float] = {}
+    if base_id:
+        query = select(InventorySnapshot.inventory_id, InventorySnapshot.balance).where(
+            InventorySnapshot.last_transaction_id == base_id
+        )
+        if inventory_ids is not None:
+            query = query.where(InventorySnapshot.inventory_id.in_(inventory_ids))
+        balances.update(session.exec(query).all())
+
+    replay = (
+        select(InventoryTransaction.inventory_id, func.sum(InventoryTransaction.quantity))
+        .where(InventoryTransaction.id > base_id, InventoryTransaction.created_at <= at)
+        .group_by(InventoryTransaction.inventory_id)
+    )
+    if next_base_id is not None:
+        replay = replay.where(InventoryTransaction.id <= next_base_id)
+    if inventory_ids is not None:
+        replay = replay.where(InventoryTransaction.inventory_id.in_(inventory_ids))
+    for inventory_id, delta in session.exec(replay):
+        balances[inventory_id] = balances.get(inventory_id, 0) + delta
+    return balances
+
+
+def has_stock_history(session: Session, inventory_id: int) -> bool:
+    """Есть ли у позиции движения в журнале или подсчеты инвентаризаций"""
+    for model in (InventoryTransaction, InventoryAuditItem):
+        if session.exec(select(model.id).where(model.inventory_id == inventory_id).limit(1)).first():
+            return True
+    return False
+
+
+def remove_item_snapshots(session: Session, inventory_id: int) -> None:
+    """
+    Удалить снимки позиции без истории перед удалением самой позиции.
+    Позиции с движениями не удаляются: журнал только дополняется.
+    """
+    session.execute(delete(InventorySnapshot).where(InventorySnapshot.inventory_id == inventory_id))
+
+
+def ensure_opening_balances(session: Session) -> int:
+    """
+    Записать начальный остаток позициям, у которых нет ни одного движения
+    (склад, заполненный до появления журнала). Коммитит.
+    """
+    has_transactions = select(InventoryTransaction.id).where(
+        InventoryTransaction.inventory_id == Inventory.id
+    ).exists()
+    items = session.exec(
+        select(Inventory.id, Inventory.quantity, Inventory.created_at)
+        .where(Inventory.quantity != 0, ~has_transactions)
+    ).all()
+    if not items:
+        return 0
+
+    session.execute(insert(InventoryTransaction), [
+        {
+            "inventory_id": inventory_id,
+            "transaction_type": InventoryTransactionType.ADJUSTMENT,
+            "quantity": quantity,
+            "balance_after": quantity,
+            "comment": "Начальный остаток",
+            "created_at": created_at,
+        }
+        for inventory_id, quantity, created_at in items
+    ])
+    session.commit()
+    return len(items)
+
+
+def transaction_dict(transaction: InventoryTransaction) -> Dict:
+    """Движение в формате, который ожидает фронтенд"""
+    return {
+        "id": transaction.id,
+        "inventory_id": transaction.inventory_id,
+        "type": transaction.transaction_type,
+        "quantity": transaction.quantity,
+        "balance_after": transaction.balance_after,
+        "comment": transaction.comment,
+        "date": transaction.created_at,
+        "referenceType": transaction.reference_type,
+        "referenceId": str(transaction.reference_id) if transaction.reference_id is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    from app.db import engine, create_db_and_tables
+
+    parser = argparse.ArgumentParser(description="Складской журнал")
+    parser.add_argument("command", choices=["snapshot"])
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    with Session(engine) as session:
+        ensure_opening_balances(session)
+        last_id = take_snapshot(session)
+        session.commit()
+    print(f"✅ Снимок остатков сохранен на транзакцию #{last_id}")
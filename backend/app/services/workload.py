@@ -0,0 +1,175 @@
+"""
+Florist workload for CRM Florist System
+Нагрузка исполнителя в день — число его несобранных заказов (новый,
+оплачен, в работе) с доставкой в этот день магазина.
+
+Для автоназначения флористов по каждому дню держится куча (нагрузка,
+executor_id): наименее загруженный — вершина кучи. День загружается лениво
+одним GROUP BY, изменения заказов этого процесса обновляют нагрузку
+точечно (новая запись в кучу, устаревшие отбрасываются при чтении), а
+раз в WORKLOAD_REFRESH_SECONDS все перечитывается, чтобы подхватить
+изменения других воркеров.
+"""
+import heapq
+import threading
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlmodel import Session, select, func
+
+from app.core.config import WORKLOAD_REFRESH_SECONDS
+from app.core.timebuckets import bucket_case, buckets, local_range
+from app.models import Order, User
+from app.services.reservations import RESERVING_STATUSES
+from app.services.sales_rollup import order_day
+
+# Должность пользователей, собирающих букеты (курьеры не назначаются)
+FLORIST_POSITION = "Флорист"
+
+# Заказы, которые исполнителю еще предстоит собрать
+WORKING_STATUSES = RESERVING_STATUSES
+
+
+def _counts(state) -> bool:
+    """Входит ли заказ (снимок) в нагрузку своего исполнителя"""
+    return bool(state and state.executor_id and state.delivery_date and state.status in WORKING_STATUSES)
+
+
+class WorkloadBalancer:
+    """Кучи нагрузки исполнителей по дням доставки"""
+
+    def __init__(self, refresh_seconds: int = WORKLOAD_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._executors: Optional[List[int]] = None
+        self._loads: Dict[date, Dict[int, int]] = {}
+        self._heaps: Dict[date, List[Tuple[int, int]]] = {}
+        self._loaded_at = 0.0
+
+    def ensure_fresh(self, session: Session) -> None:
+        """
+        Перечитать исполнителей и сбросить дни, если данные устарели.
+        Исполнители — флористы; если ни у кого не указана должность
+        (старые базы), исполнителями считаются все пользователи.
+        """
+        if self._executors is not None and time.monotonic() - self._loaded_at <= self.refresh_seconds:
+            return
+        query = select(User.id).order_by(User.id)
+        has_positions = session.exec(select(User.id).where(User.position.is_not(None)).limit(1)).first()
+        if has_positions is not None:
+            query = query.where(User.position == FLORIST_POSITION)
+        executors = list(session.exec(query).all())
+        with self._lock:
+            self._executors = executors
+            self._loads.clear()
+            self._heaps.clear()
+            self._loaded_at = time.monotonic()
+
+    def _load_day(self, session: Session, day: date) -> None:
+        counts = dict(session.exec(
+            select(Order.executor_id, func.count())
+            .where(
+                Order.executor_id.is_not(None),
+                Order.status.in_(WORKING_STATUSES),
+                *local_range(Order.delivery_date, day, day)
+            )
+            .group_by(Order.executor_id)
+        ).all())
+        loads = {executor_id: counts.get(executor_id, 0) for executor_id in self._executors}
+        heap = [(load, executor_id) for executor_id, load in loads.items()]
+        heapq.heapify(heap)
+        self._loads[day], self._heaps[day] = loads, heap
+
+    def pick(self, session: Session, day: date, exclude=None) -> Optional[int]:
+        """
+        Наименее загруженный исполнитель на день (при равенстве — меньший id).
+        exclude — снимок заказа, который не учитывается в нагрузке (переназначение).
+        """
+        self.ensure_fresh(session)
+        with self._lock:
+            if day not in self._loads:
+                self._load_day(session, day)
+            loads, heap = self._loads[day], self._heaps[day]
+            excluded = exclude.executor_id if _counts(exclude) and order_day(exclude.delivery_date) == day else None
+            self._change(day, excluded, -1)
+            # Записи с устаревшей нагрузкой остаются в куче до первого чтения
+            while heap and loads.get(heap[0][1]) != heap[0][0]:
+                heapq.heappop(heap)
+            executor_id = heap[0][1] if heap else None
+            self._change(day, excluded, 1)
+            return executor_id
+
+    def _change(self, day: date, executor_id: Optional[int], delta: int) -> None:
+        loads = self._loads.get(day)
+        if executor_id is None or loads is None or executor_id not in loads:
+            return
+        loads[executor_id] += delta
+        heapq.heappush(self._heaps[day], (loads[executor_id], executor_id))
+
+    def change(self, day: date, executor_id: Optional[int], delta: int) -> None:
+        """Изменить нагрузку исполнителя в загруженном дне"""
+        with self._lock:
+            self._change(day, executor_id, delta)
+
+    def apply_order_change(self, before, after) -> None:
+        """Учесть изменение заказа по снимкам до и после (None — нет заказа)"""
+        for state, delta in ((before, -1), (after, 1)):
+            if _counts(state):
+                self.change(order_day(state.delivery_date), state.executor_id, delta)
+
+    def loads(self, session: Session, day: date) -> Dict[int, int]:
+        """Текущая нагрузка всех исполнителей на день"""
+        self.ensure_fresh(session)
+        with self._lock:
+            if day not in self._loads:
+                self._load_day(session, day)
+            return dict(self._loads[day])
+
+
+balancer = WorkloadBalancer()
+
+
+def workload_report(session: Session, date_from: date, date_to: date) -> List[Dict]:
+    """
+    Заказы по исполнителям, статусам и дням доставки — один GROUP BY.
+    Raises:
+        ValueError: date_from позже date_to или слишком много дней
+    """
+    if date_from > date_to:
+        raise ValueError("date_from must not be after date_to")
+    days = buckets(date_from, date_to, "day")
+    day = bucket_case(Order.delivery_date, days, [bucket.start.date() for bucket in days])
+    rows = session.exec(
+        select(Order.executor_id, User.username, day, Order.status, func.count())
+        .select_from(Order)
+        .outerjoin(User, User.id == Order.executor_id)
+        .where(*local_range(Order.delivery_date, date_from, date_to))
+        .group_by(Order.executor_id, User.username, day, Order.status)
+        .order_by(Order.executor_id, day)
+    ).all()
+
+    executors: Dict[Optional[int], Dict] = {}
+    for executor_id, username, order_day_value, status, count in rows:
+        executor = executors.setdefault(executor_id, {
+            "executor_id": executor_id,
+            "username": username,
+            "total": 0,
+            "working": 0,
+            "by_status": {},
+            "by_day": {},
+        })
+        working = count if status in WORKING_STATUSES else 0
+        executor["total"] += count
+        executor["working"] += working
+        executor["by_status"][status] = executor["by_status"].get(status, 0) + count
+        by_day = executor["by_day"].setdefault(
+            order_day_value, {"date": order_day_value, "total": 0, "working": 0}
+        )
+        by_day["total"] += count
+        by_day["working"] += working
+
+    return [
+        {**executor, "by_day": list(executor["by_day"].values())}
+        for executor in executors.values()
+    ]